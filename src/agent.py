@@ -7,25 +7,35 @@ unchanged, so `app.py` and the rest of the project keep working.
 
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import logging
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, AsyncGenerator, TypedDict, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
 import chainlit as cl
+import numpy as np
 
 from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
+from confidence import ConfidencePolicy
+from intent_classifier import IntentClassifier
+from mmr import duplicate_tokens
 from rag import RAGSystem
+from search_cache import SearchCache
+from singleflight import SingleFlight
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -35,6 +45,11 @@ class AgentState(TypedDict):
     session_id: str
     history: ChatMessageHistory
     docs: List[Any]
+    scores: List[float]
+    query_vector: Optional[np.ndarray]
+    route: str
+    search_query: str
+    speculation: Optional[asyncio.Task]
     web_results: str
     context: str
 
@@ -46,11 +61,47 @@ class AivancityAgent:
         logger.info("Initializing AivancityAgent...")
         
         self.rag = rag_system
+        # Chunks put in the prompt; re-ranked ones are more relevant, so fewer are needed
+        self.context_k = int(os.getenv("CONTEXT_CHUNKS", 3 if rag_system.reranker else 5))
+        # Turns whose retrieval scores are conclusive are routed without asking the LLM, once the
+        # scores are calibrated (python src/confidence.py --fit); None until then
+        self.confidence_policy = ConfidencePolicy.from_env() if rag_system.score_calibrator.fitted else None
+        if self.confidence_policy is None:
+            logger.info("No fitted score calibration; every turn's route is left to the classifier or the LLM")
+        # Local classifier of the query embedding (python src/intent_classifier.py train); None if not trained
+        self.intent_classifier = IntentClassifier.load(min_confidence=float(os.getenv("INTENT_CONFIDENCE", 0.8)))
+        if self.intent_classifier is not None and self.intent_classifier.model_name != rag_system.model_name:
+            logger.warning(f"Intent classifier was trained with {self.intent_classifier.model_name}; not using it")
+            self.intent_classifier = None
+        self.confident_routes = 0
+        self.classifier_routes = 0
+        self.llm_routes = 0
         
         tavily_api_key = os.getenv("TAVILY_API_KEY")
         if not tavily_api_key:
             raise ValueError("TAVILY_API_KEY environment variable is not set")
-        self.tavily = TavilyClient(api_key=tavily_api_key)
+        # Web searches are awaited so that one slow search does not block other sessions
+        self.async_tavily = AsyncTavilyClient(api_key=tavily_api_key)
+        # Web search responses are reused for SEARCH_CACHE_TTL seconds; 0 disables the cache
+        search_cache_ttl = float(os.getenv("SEARCH_CACHE_TTL", 6 * 3600))
+        self.search_cache = SearchCache(
+            ttl=search_cache_ttl,
+            negative_ttl=float(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", 15 * 60)),
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", 5000)),
+        ) if search_cache_ttl > 0 else None
+        # Identical decisions, query generations and searches in flight share one upstream call
+        self._single_flight = SingleFlight()
+        # Embedding and index search are CPU-bound; they run here, off the event loop
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RETRIEVAL_WORKERS", 4)), thread_name_prefix="retrieval"
+        )
+        # While the LLM decides whether to search, start the search work anyway: "off", "query"
+        # (generate the search query) or "search" (and run the web search); discarded if unneeded
+        self.speculate = os.getenv("SPECULATE", "search").lower()
+        if self.speculate not in ("off", "query", "search"):
+            raise ValueError(f"Unknown SPECULATE mode: {self.speculate}")
+        self.speculation_stats = {"started": 0, "used": 0, "discarded": 0, "cancelled": 0,
+                                  "wasted_queries": 0, "wasted_searches": 0}
 
         self.llm = ChatOpenAI(
             model=model_name,
@@ -100,6 +151,35 @@ class AivancityAgent:
             | StrOutputParser()
         )
 
+        # Decides on the search and writes its query in a single LLM call
+        self.planner_prompt = PromptTemplate.from_template(
+            "You are a planner deciding if a web search is needed and, if so, what to search for.\n"
+            "Question: {question}\n\n"
+            "Chat History:\n{chat_history}\n\n"
+            "Known context:\n{context}\n\n"
+            "Decision rules:\n"
+            "1. No search is needed if the question can be answered with:\n"
+            "   - Common knowledge\n"
+            "   - Basic conversation\n"
+            "   - The provided context\n"
+            "2. A search is needed only if the question requires:\n"
+            "   - Up-to-date information\n"
+            "   - Specific facts not in the context and not known by you\n"
+            "   - Recent events or data\n\n"
+            "If a search is needed, write a specific, concise web search query with appropriate "
+            "keywords and the relevant context from the chat history.\n\n"
+            'Respond with JSON only: {{"needs_search": true or false, "search_query": "the query, or empty"}}'
+        )
+
+        self.planner_chain = (
+            self.planner_prompt
+            | self.llm
+            | StrOutputParser()
+        )
+        # One planner call instead of the decision and query generation calls; off falls back to both
+        self.use_planner = os.getenv("PLANNER", "true").lower() in ("1", "true", "yes", "on")
+        self.planner_fallbacks = 0
+
         self.prompt = ChatPromptTemplate.from_messages([
             SystemMessage(content=(
                 "You are an AI assistant for Aivancity School for Technology, "
@@ -129,54 +209,162 @@ class AivancityAgent:
     def clear_history(self, session_id: str) -> None:
         self._histories.pop(session_id, None)
 
-    def _web_search(self, query: str, k: int = 3) -> str:
+    @staticmethod
+    def _format_search_results(res: Dict[str, Any]) -> str:
+        results = []
+        for r in res.get("results", []):
+            title = r.get("title", "No title")
+            content = r.get("content", "No content")
+            url = r.get("url", "No URL")
+            results.append(f"- {title}: {content} ({url})")
+        return "\n".join(results) if results else "No search results found."
+
+    async def _afetch_search(self, query: str, k: int) -> Dict[str, Any]:
+        # SQLite calls are quick but still file I/O, so they stay off the event loop too
+        res = await asyncio.to_thread(self.search_cache.get, query, k) if self.search_cache else None
+        if res is None:
+            res = {"results": (await self.async_tavily.search(query, max_results=k)).get("results", [])}
+            if self.search_cache:
+                await asyncio.to_thread(self.search_cache.put, query, k, res)
+        return res
+
+    async def _aweb_search(self, query: str, k: int = 3) -> str:
         try:
-            res = self.tavily.search(query, max_results=k)
-            results = []
-            for r in res.get("results", []):
-                title = r.get("title", "No title")
-                content = r.get("content", "No content")
-                url = r.get("url", "No URL")
-                results.append(f"- {title}: {content} ({url})")
-            return "\n".join(results) if results else "No search results found."
+            key = ("search", SearchCache.normalize(query), k)
+            res = await self._single_flight.do(key, lambda: self._afetch_search(query, k))
+            return self._format_search_results(res)
         except Exception as e:
             logger.error(f"Error in web search: {str(e)}")
             return "Error performing web search."
 
-    def _should_use_search(self, docs: List[Any], question: str) -> str:
+    @staticmethod
+    def _search_decision_input(docs: List[Any], question: str) -> Dict[str, str]:
         logger.info(f"Evaluating if web search is needed for question: {question[:100]}...")
         context_preview = "\n".join(d.page_content[:300] for d in docs[:3])
         logger.debug(f"Context preview: {context_preview[:200]}...")
-        result = self.search_decision_chain.invoke({
-            "question": question,
-            "context": context_preview
-        })
+        return {"question": question, "context": context_preview}
+
+    @staticmethod
+    def _parse_search_decision(result: str) -> str:
         logger.info(f"Search decision result: {result}")
         return "yes" if "yes" in result.lower() else "no"
 
-    def _generate_search_query(self, question: str, chat_history: List[BaseMessage]) -> str:
-        """Generate an optimized search query based on the question and chat history."""
+    def _should_use_search(self, docs: List[Any], question: str) -> str:
+        result = self.search_decision_chain.invoke(self._search_decision_input(docs, question))
+        return self._parse_search_decision(result)
+
+    async def _ainvoke_once(self, name: str, chain, inputs: Dict[str, str]) -> str:
+        """`chain.ainvoke(inputs)`, shared with an identical call already in flight."""
+        key = (name,) + tuple(sorted(inputs.items()))
+        result = await self._single_flight.do(key, lambda: chain.ainvoke(inputs))
+        logger.debug(f"Single-flight: {self._single_flight.stats()}")
+        return result
+
+    async def _ashould_use_search(self, docs: List[Any], question: str) -> str:
+        result = await self._ainvoke_once("decision", self.search_decision_chain,
+                                          self._search_decision_input(docs, question))
+        return self._parse_search_decision(result)
+
+    @staticmethod
+    def _query_generation_input(question: str, chat_history: List[BaseMessage]) -> Dict[str, str]:
         logger.info("Generating optimized search query...")
         # Convert chat history to string format
         history_str = "\n".join([
             f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
             for msg in chat_history[-5:]  # Use last 5 messages for context
         ])
-        
-        query = self.query_generation_chain.invoke({
-            "question": question,
-            "chat_history": history_str
-        })
+        return {"question": question, "chat_history": history_str}
+
+    @staticmethod
+    def _parse_plan(result: str) -> Optional[Dict[str, Any]]:
+        """{"needs_search": bool, "search_query": str} from the planner's answer, or None if unreadable."""
+        match = re.search(r"\{.*\}", result, re.DOTALL)
+        plan = None
+        if match:
+            try:
+                plan = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                plan = None
+        if not isinstance(plan, dict) or "needs_search" not in plan:
+            # Not JSON: look for the fields written as "key: value"
+            needs = re.search(r"needs_search\W+(true|false|yes|no)", result, re.IGNORECASE)
+            if not needs:
+                return None
+            query = re.search(r"search_query\W+([^\"\n}]*)", result, re.IGNORECASE)
+            plan = {"needs_search": needs.group(1), "search_query": query.group(1) if query else ""}
+        needs_search = plan["needs_search"]
+        if isinstance(needs_search, str):
+            needs_search = needs_search.strip().lower() in ("true", "yes")
+        return {"needs_search": bool(needs_search), "search_query": str(plan.get("search_query") or "").strip()}
+
+    async def _aplan(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        inputs = self._search_decision_input(state["docs"], state["user_input"])
+        inputs["chat_history"] = self._query_generation_input(
+            state["user_input"], state["history"].messages
+        )["chat_history"]
+        result = await self._ainvoke_once("plan", self.planner_chain, inputs)
+        plan = self._parse_plan(result)
+        logger.info(f"Planner result: {plan if plan is not None else result}")
+        return plan
+
+    async def _agenerate_search_query(self, question: str, chat_history: List[BaseMessage]) -> str:
+        query = await self._ainvoke_once("query", self.query_generation_chain,
+                                         self._query_generation_input(question, chat_history))
         logger.info(f"Generated search query: {query}")
         return query
 
+    def _start_speculation(self, state: AgentState) -> asyncio.Task:
+        """Generate the search query (and search) in the background, as if the search were needed."""
+        progress = {"query": False, "search": False}
+
+        async def run():
+            # Flags are set when a call is issued: a cancelled call may still be billed
+            progress["query"] = True
+            query = await self._agenerate_search_query(state["user_input"], state["history"].messages)
+            if self.speculate != "search":
+                return query, None
+            progress["search"] = True
+            results = await self._aweb_search(query)
+            return query, results
+
+        self.speculation_stats["started"] += 1
+        task = asyncio.create_task(run())
+        task.progress = progress
+        return task
+
+    def _discard_speculation(self, task: asyncio.Task):
+        stats = self.speculation_stats
+        stats["discarded"] += 1
+        stats["wasted_queries"] += task.progress["query"]
+        stats["wasted_searches"] += task.progress["search"]
+        if not task.done():
+            stats["cancelled"] += 1
+            task.cancel()
+            # A call that fails before the cancellation lands is not reported as unhandled either
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        elif not task.cancelled():
+            task.exception()  # retrieved, so a failure is not reported as unhandled
+        logger.info(f"Speculative search discarded: {stats}")
+
     def _build_graph(self):
         g = StateGraph(AgentState)
 
         async def retrieve(state: AgentState) -> AgentState:
             logger.info("Retrieving from knowledge base...")
-            state["docs"] = self.rag.retrieve(state["user_input"])
+            loop = asyncio.get_running_loop()
+
+            def run():
+                # The classifier reuses the query vector, embedded here rather than on the event loop
+                vector = self.rag.embed_query(state["user_input"]) if self.intent_classifier is not None else None
+                return vector, self.rag.retrieve_with_scores(state["user_input"], k=self.context_k)
+
+            state["query_vector"], hits = await loop.run_in_executor(self._retrieval_executor, run)
+            state["docs"] = [doc for doc, _ in hits]
+            state["scores"] = [score for _, score in hits]
             logger.info(f"Retrieved {len(state['docs'])} documents")
+            logger.debug(f"Query embedding cache: {self.rag.query_cache_info()}")
+            if self.rag.reranker is not None:
+                logger.debug(f"Reranker: {self.rag.reranker.stats()}")
             return state
 
         async def supervisor(state: AgentState) -> AgentState:
@@ -184,12 +372,51 @@ class AivancityAgent:
             status.content = "🤔 Evaluating if web search is needed..."
             await status.update()
             logger.info("Supervisor evaluating search need...")
+            route = self.confidence_policy.route(state["scores"]) if self.confidence_policy else None
+            if route is not None:
+                self.confident_routes += 1
+                logger.info(f"Router decided to: {route} (retrieval scores {[round(s, 3) for s in state['scores']]}, "
+                            f"{self.confident_routes} turns so far)")
+                state["route"] = route
+                return state
+            if state["query_vector"] is not None:
+                route = self.intent_classifier.route(state["query_vector"])
+                if route is not None:
+                    self.classifier_routes += 1
+                    logger.info(f"Router decided to: {route} (intent classifier, "
+                                f"{self.classifier_routes} turns so far)")
+                    state["route"] = route
+                    return state
+            self.llm_routes += 1
+            if self.use_planner:
+                plan = await self._aplan(state)
+                if plan is not None:
+                    state["route"] = "search" if plan["needs_search"] else "generate"
+                    state["search_query"] = plan["search_query"]
+                    logger.info(f"Router decided to: {state['route']}")
+                    return state
+                self.planner_fallbacks += 1
+                logger.warning(f"Unreadable planner answer ({self.planner_fallbacks} so far); "
+                               "asking for the decision and query separately")
+            speculation = self._start_speculation(state) if self.speculate != "off" else None
+            try:
+                decision = await self._ashould_use_search(state["docs"], state["user_input"])
+            except BaseException:
+                # Failed or cancelled turn: stop the background search instead of leaking it
+                if speculation is not None:
+                    self._discard_speculation(speculation)
+                raise
+            state["route"] = "generate" if decision == "yes" else "search"
+            logger.info(f"Router decided to: {state['route']}")
+            if speculation is not None:
+                if state["route"] == "search":
+                    state["speculation"] = speculation
+                else:
+                    self._discard_speculation(speculation)
             return state
 
         def router(state: AgentState) -> str:
-            route = self._should_use_search(state["docs"], state["user_input"])
-            logger.info(f"Router decided to: {'generate' if route == 'yes' else 'search'}")
-            return "generate" if route == "yes" else "search"
+            return state["route"]
 
         async def search(state: AgentState) -> AgentState:
             status = cl.user_session.get("status_msg")
@@ -197,13 +424,23 @@ class AivancityAgent:
             await status.update()
             logger.info("Performing web search...")
             
-            # Generate optimized search query
-            search_query = self._generate_search_query(
-                state["user_input"],
-                state["history"].messages
-            )
-            
-            state["web_results"] = self._web_search(search_query)
+            speculation = state.get("speculation")
+            if state.get("search_query"):
+                # Written by the planner
+                state["web_results"] = await self._aweb_search(state["search_query"])
+            elif speculation is not None:
+                # Started while the supervisor was deciding
+                search_query, web_results = await speculation
+                self.speculation_stats["used"] += 1
+                state["web_results"] = web_results or await self._aweb_search(search_query)
+            else:
+                # Generate optimized search query
+                search_query = await self._agenerate_search_query(
+                    state["user_input"],
+                    state["history"].messages
+                )
+
+                state["web_results"] = await self._aweb_search(search_query)
             logger.info(f"Web search returned {len(state['web_results'].split('\n'))} results")
             return state
 
@@ -216,6 +453,9 @@ class AivancityAgent:
             if state["web_results"]:
                 pieces.append(f"Additional web search:\n{state['web_results']}")
             state["context"] = "\n\n".join(pieces)
+            logger.info(f"Duplicated tokens in context: {duplicate_tokens([d.page_content for d in state['docs']])}")
+            if self.rag.mmr_lambda is not None:
+                logger.debug(f"MMR: {self.rag.mmr_stats()}")
             logger.info(f"Combined context length: {len(state['context'])} characters")
             return state
 
@@ -250,6 +490,11 @@ class AivancityAgent:
             "session_id": session_id,
             "history": hist,
             "docs": [],
+            "scores": [],
+            "query_vector": None,
+            "route": "",
+            "search_query": "",
+            "speculation": None,
             "web_results": "",
             "context": "",
         }
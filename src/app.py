@@ -6,9 +6,11 @@ This module handles the web interface and chat interactions.
 import uuid
 import os
 import chainlit as cl
+from chainlit.server import app as server
 from dotenv import load_dotenv
 from rag import RAGSystem
 from agent import AivancityAgent
+from index_versions import IndexWatcher
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -16,15 +18,26 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+INDEX_PATH = "data/faiss_index"
+
 rag_system = RAGSystem()
 
 try:
-    rag_system.load_index()
+    rag_system.load_index(INDEX_PATH)
 except ValueError:
     print("Warning: No FAISS index found. Please run initialize.py first.")
 
+# Swap in each index version published by initialize.py, without a restart
+index_watcher = IndexWatcher(rag_system, INDEX_PATH, interval=float(os.getenv("INDEX_POLL_SECONDS", "10")))
+index_watcher.start()
+
 agent = AivancityAgent(rag_system)
 
+@server.get("/index-version")
+async def index_version():
+    """Active index version, for monitoring."""
+    return {"version": rag_system.index_version, "path": rag_system.index_path}
+
 @cl.on_chat_start
 async def start():
     cl.user_session.set("id", cl.user_session.get("id") or str(uuid.uuid4()))
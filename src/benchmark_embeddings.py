@@ -0,0 +1,98 @@
+"""
+Benchmark the ONNX int8 embedding backend against HuggingFaceEmbeddings.
+Reports query latency, document throughput and top-k retrieval agreement
+on the chunks of the existing FAISS index.
+
+    python src/benchmark_embeddings.py --docs 2000 --k 5
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+import faiss
+import numpy as np
+
+from onnx_embeddings import OnnxEmbeddings
+from rag import RAGSystem
+from vector_index import stored_ids
+
+SAMPLE_QUESTIONS = [
+    "What programs does Aivancity offer?",
+    "Tell me about the research at Aivancity",
+    "What is Aivancity's mission?",
+    "How can I contact Aivancity?",
+    "Where is the Aivancity campus located?",
+    "How do admissions work for the first year?",
+    "What support exists for learners with disabilities?",
+    "Who is on the governance board of Aivancity?",
+    "What is the Alliance for Sciences and Technology Paris-Cachan?",
+    "What does the BODACC notice say about Aivancity?",
+]
+
+
+def _latencies_ms(embeddings, queries: List[str]) -> List[float]:
+    embeddings.embed_query(queries[0])  # warm-up
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _throughput(embeddings, texts: List[str]) -> float:
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def _top_k(embeddings, texts: List[str], queries: List[str], k: int) -> np.ndarray:
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    _, ids = index.search(np.asarray([embeddings.embed_query(q) for q in queries], dtype="float32"), k)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="data/faiss_index", help="Index whose chunks are used as the corpus")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--docs", type=int, default=2000, help="Maximum number of chunks to embed")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    reference = RAGSystem(model_name=args.model, embedding_backend="huggingface", embedding_cache_dir=None)
+    reference.load_index(args.index)
+    docstore = reference.vector_store.docstore
+    texts = [docstore.search(str(i)).page_content for i in stored_ids(reference.vector_store.index)]
+    random.Random(0).shuffle(texts)
+    texts = texts[:args.docs]
+    # Sample questions plus chunk openings, which look like keyword queries
+    queries = SAMPLE_QUESTIONS + [" ".join(text.split()[:12]) for text in texts[:40]]
+
+    backends = {
+        "huggingface": reference.embeddings,
+        "onnx-int8": OnnxEmbeddings(model_name=args.model),
+    }
+    print(f"Corpus: {len(texts)} chunks, {len(queries)} queries, k={args.k}\n")
+    top_k = {}
+    for name, embeddings in backends.items():
+        latencies = _latencies_ms(embeddings, queries)
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{name:12s} query latency p50 {statistics.median(latencies):6.2f} ms, p95 {p95:6.2f} ms | "
+              f"throughput {_throughput(embeddings, texts):7.1f} chunks/s")
+        top_k[name] = _top_k(embeddings, texts, queries, args.k)
+
+    overlap = [
+        len(set(a) & set(b)) / args.k for a, b in zip(top_k["huggingface"], top_k["onnx-int8"])
+    ]
+    top1 = np.mean(top_k["huggingface"][:, 0] == top_k["onnx-int8"][:, 0])
+    print(f"\nTop-{args.k} agreement: {np.mean(overlap):.1%} (top-1 identical: {top1:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+BM25 inverted index over the indexed chunks, for hybrid retrieval.
+Postings are stored as flat numpy arrays next to the FAISS index (no
+pickle) with each posting's BM25 weight precomputed, so scoring a query is a
+gather and a sum over the postings of its terms. Live adds and deletes are
+kept as an overlay until the index is rebuilt on the next save.
+"""
+
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DIRNAME = "bm25"
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, accent-folded word tokens ("Réseau" and "reseau" match)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return TOKEN_RE.findall(text)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int, c: int = 60) -> List[int]:
+    """Fuse ranked ID lists: each ID scores sum(1 / (c + rank)); returns the best k IDs."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking):
+            if vector_id >= 0:
+                scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+class BM25Index:
+    """Okapi BM25 over chunks keyed by vector ID."""
+
+    def __init__(self, terms: Dict[str, int], idf: np.ndarray, offsets: np.ndarray, rows: np.ndarray,
+                 weights: np.ndarray, doc_ids: np.ndarray, avgdl: float, k1: float = 1.5, b: float = 0.75):
+        self.terms = terms
+        self.idf = idf
+        # Postings of term t are rows[offsets[t]:offsets[t + 1]], rows indexing doc_ids
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.doc_ids = doc_ids
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        self._added: Dict[int, Tuple[Counter, int]] = {}
+        self._deleted = set()
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[int, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index (vector ID, text) pairs."""
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_ids, doc_lens = [], []
+        for vector_id, text in records:
+            tokens = tokenize(text)
+            row = len(doc_ids)
+            doc_ids.append(vector_id)
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, tf))
+
+        n_docs = len(doc_ids)
+        doc_lens = np.asarray(doc_lens, dtype="float32")
+        avgdl = float(doc_lens.mean()) if n_docs else 1.0
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        rows = np.empty(offsets[-1], dtype="int32")
+        tfs = np.empty(offsets[-1], dtype="float32")
+        idf = np.empty(len(terms), dtype="float32")
+        for t, term in enumerate(terms):
+            term_postings = np.asarray(postings[term])
+            rows[offsets[t]:offsets[t + 1]] = term_postings[:, 0]
+            tfs[offsets[t]:offsets[t + 1]] = term_postings[:, 1]
+            idf[t] = np.log(1 + (n_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+        norms = k1 * (1 - b + b * doc_lens[rows] / avgdl) if len(rows) else np.empty(0, dtype="float32")
+        term_of_posting = np.repeat(np.arange(len(terms)), np.diff(offsets))
+        weights = (idf[term_of_posting] * tfs * (k1 + 1) / (tfs + norms)).astype("float32")
+        return cls({term: t for t, term in enumerate(terms)}, idf, offsets, rows, weights,
+                   np.asarray(doc_ids, dtype="int64"), avgdl, k1, b)
+
+    def save(self, index_path: str):
+        path = os.path.join(index_path, DIRNAME)
+        os.makedirs(path, exist_ok=True)
+        for name in ("idf", "offsets", "rows", "weights", "doc_ids"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms": sorted(self.terms, key=self.terms.get), "avgdl": self.avgdl,
+                       "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_path: str):
+        """The index saved in `index_path`, memory-mapped; None if there is none."""
+        path = os.path.join(index_path, DIRNAME)
+        if not os.path.exists(os.path.join(path, "terms.json")):
+            return None
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+            for name in ("idf", "offsets", "rows", "weights", "doc_ids")
+        }
+        terms = {term: t for t, term in enumerate(meta["terms"])}
+        return cls(terms, avgdl=meta["avgdl"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        for vector_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            self._added[int(vector_id)] = (Counter(tokens), len(tokens))
+
+    def delete(self, ids: Sequence[int]):
+        for vector_id in ids:
+            self._added.pop(int(vector_id), None)
+            self._deleted.add(int(vector_id))
+
+    def _overlay_scores(self, query_terms: Iterable[str]) -> Tuple[List[int], List[float]]:
+        """Scores of chunks added since the last build, with the built index's statistics."""
+        n_docs = len(self.doc_ids)
+        ids, scores = [], []
+        for vector_id, (counts, length) in self._added.items():
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avgdl)
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    t = self.terms.get(term)
+                    idf = float(self.idf[t]) if t is not None else float(np.log(1 + (n_docs + 0.5) / 1.5))
+                    score += idf * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                ids.append(vector_id)
+                scores.append(score)
+        return ids, scores
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (vector IDs, BM25 scores) for `query`, best first.
+
+        `allowed` (sorted vector IDs) restricts the results, e.g. to a metadata filter.
+        """
+        query_terms = dict.fromkeys(tokenize(query))
+        term_ids = [self.terms[term] for term in query_terms if term in self.terms]
+        if term_ids:
+            rows = np.concatenate([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+            weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+            if len(rows) * 8 > len(self.doc_ids):
+                # Common terms: a dense accumulator over all chunks beats sorting the postings
+                dense = np.bincount(rows, weights=weights, minlength=len(self.doc_ids))
+                unique_rows = np.flatnonzero(dense)
+                scores = dense[unique_rows]
+            else:
+                unique_rows, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=weights)
+            ids = self.doc_ids[unique_rows]
+        else:
+            ids, scores = np.empty(0, dtype="int64"), np.empty(0)
+        if self._deleted or self._added:
+            # Stale versions of re-added chunks are dropped with the deleted ones
+            keep = ~np.isin(ids, list(self._deleted | self._added.keys()))
+            added_ids, added_scores = self._overlay_scores(query_terms)
+            ids = np.concatenate([ids[keep], np.asarray(added_ids, dtype="int64")])
+            scores = np.concatenate([scores[keep], added_scores])
+        if allowed is not None:
+            keep = np.isin(ids, allowed, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
@@ -0,0 +1,148 @@
+"""
+Calibrated retrieval scores and the confidence policy of the agent router.
+A chunk's score is the probability, fitted with Platt scaling on the cosine
+similarity between query and chunk, that the LLM supervisor judges the
+retrieved context sufficient. Confident turns skip the supervisor call.
+
+python src/confidence.py --fit   # fit on the test questions, report agreement with the LLM
+"""
+
+import argparse
+import json
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+CALIBRATION_PATH = "data/score_calibration.json"
+
+
+class ScoreCalibrator:
+    """Maps cosine similarities to probabilities: sigmoid(slope * similarity + intercept)."""
+
+    def __init__(self, slope: float = 12.0, intercept: float = -6.0, fitted: bool = False):
+        # The defaults put 0.5 at a cosine of 0.5; fit() replaces them with the corpus' own
+        self.slope = slope
+        self.intercept = intercept
+        # Only fitted scores are trusted to route turns (see ConfidencePolicy)
+        self.fitted = fitted
+
+    def __call__(self, similarities) -> np.ndarray:
+        z = self.slope * np.asarray(similarities, dtype="float64") + self.intercept
+        return 1 / (1 + np.exp(-z))
+
+    def fit(self, similarities: Sequence[float], labels: Sequence[bool], iterations: int = 50,
+            l2: float = 1e-3) -> "ScoreCalibrator":
+        """Logistic regression of `labels` on `similarities` (Newton's method)."""
+        x = np.column_stack([np.asarray(similarities, dtype="float64"), np.ones(len(similarities))])
+        y = np.asarray(labels, dtype="float64")
+        w = np.array([self.slope, self.intercept])
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(-x @ w))
+            gradient = x.T @ (p - y) + l2 * w
+            hessian = (x * (p * (1 - p))[:, None]).T @ x + l2 * np.eye(2)
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        self.slope, self.intercept = float(w[0]), float(w[1])
+        self.fitted = True
+        return self
+
+    def save(self, path: str = CALIBRATION_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"slope": self.slope, "intercept": self.intercept}, f)
+
+    @classmethod
+    def load(cls, path: str = CALIBRATION_PATH) -> "ScoreCalibrator":
+        """The saved calibration, or the default (unfitted) one if there is none."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f), fitted=True)
+
+
+class ConfidencePolicy:
+    """Routes a turn from its retrieval scores, or returns None to leave it to the LLM.
+
+    "generate" when the top score reaches `min_score` (and leads the second by
+    `min_margin`, if set); "search" when it is below `search_below`, if set.
+    The agent only applies it to scores from a fitted ScoreCalibrator.
+    """
+
+    def __init__(self, min_score: Optional[float] = 0.8, min_margin: Optional[float] = None,
+                 search_below: Optional[float] = None):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.search_below = search_below
+
+    @classmethod
+    def from_env(cls) -> "ConfidencePolicy":
+        def value(name: str, default: Optional[float]) -> Optional[float]:
+            raw = os.getenv(name)
+            if raw is None:
+                return default
+            return float(raw) if raw.strip() else None
+        return cls(value("CONFIDENT_SCORE", 0.8), value("CONFIDENT_MARGIN", None),
+                   value("SEARCH_BELOW_SCORE", None))
+
+    def route(self, scores: Sequence[float]) -> Optional[str]:
+        if not len(scores):
+            return None
+        ordered = sorted(scores, reverse=True)
+        top = ordered[0]
+        second = ordered[1] if len(ordered) > 1 else 0.0
+        if self.min_score is not None and top >= self.min_score and (
+                self.min_margin is None or top - second >= self.min_margin):
+            return "generate"
+        if self.search_below is not None and top < self.search_below:
+            return "search"
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit retrieval score calibration against the LLM router")
+    parser.add_argument("--fit", action="store_true", help="Fit and save the calibration")
+    parser.add_argument("--queries", help="File with one question per line (default: the test questions)")
+    parser.add_argument("--output", default=CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    from agent import AivancityAgent
+    from evaluate import create_test_cases
+    from initialize import initialize_rag
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            questions: List[str] = [line.strip() for line in f if line.strip()]
+    else:
+        questions = [case["question"] for case in create_test_cases()]
+
+    rag_system = initialize_rag()
+    agent = AivancityAgent(rag_system)
+    scores, labels = [], []
+    for question in questions:
+        hits = rag_system.retrieve_with_scores(question, k=agent.context_k, calibrated=False)
+        decision = agent._should_use_search([doc for doc, _ in hits], question)
+        scores.append([score for _, score in hits])
+        labels.append(decision == "yes")
+
+    calibrator = ScoreCalibrator.load(args.output)
+    if args.fit:
+        calibrator.fit([max(row, default=0.0) for row in scores], labels)
+        calibrator.save(args.output)
+        print(f"Saved calibration to {args.output}: slope={calibrator.slope:.3f} intercept={calibrator.intercept:.3f}")
+
+    policy = ConfidencePolicy.from_env()
+    routed = skipped = 0
+    for row, label in zip(scores, labels):
+        route = policy.route(calibrator(row).tolist())
+        if route is not None:
+            skipped += 1
+            routed += (route == "generate") == label
+    print(f"{len(questions)} questions, {sum(labels)} judged answerable from the context by the LLM")
+    print(f"Policy skips the LLM on {skipped}/{len(questions)}, agreeing with it on {routed}/{skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,243 @@
 import os
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
 import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
+
+# Frequent function words, enough to tell the French and English PDFs apart
+_STOPWORDS = {
+    "fr": {"le", "la", "les", "des", "du", "et", "est", "une", "dans", "pour", "sur", "avec", "qui", "que", "au",
+           "aux", "par", "sont", "nous", "vous", "ce", "cette", "ses", "leur"},
+    "en": {"the", "and", "of", "to", "is", "in", "for", "with", "that", "on", "are", "this", "by", "from",
+           "we", "you", "our", "it", "be", "as", "an", "its", "their", "at"},
+}
+
+
+def detect_language(text: str) -> str:
+    """"fr", "en" or "unknown", from the stopwords the text uses."""
+    words = text.lower().split()
+    counts = {language: sum(word in stopwords for word in words) for language, stopwords in _STOPWORDS.items()}
+    language = max(counts, key=counts.get)
+    return language if counts[language] >= 3 else "unknown"
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> Tuple[List[Tuple[int, str]], Optional[str]]:
+    """Extract the text of pages [start, stop) from a PDF.
+
+    Returns the pages extracted before the first failure, if any, and the
+    error message (None when the whole range was read), like the serial loader
+    which keeps the pages it already read. Module-level so it can be pickled
+    and run inside a worker process.
+    """
+    pages = []
+    try:
+        pdf_document = fitz.open(file_path)
+        try:
+            for page_num in range(start, min(stop, len(pdf_document))):
+                pages.append((page_num, pdf_document[page_num].get_text()))
+        finally:
+            pdf_document.close()
+    except Exception as e:
+        return pages, str(e)
+    return pages, None
+
+
 class AivancityDataLoader:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", workers: int = 1, pages_per_task: int = 16):
         self.data_dir = data_dir
+        # Number of worker processes used by load_pdfs (1 keeps extraction serial)
+        self.workers = workers
+        # Large PDFs are split into page ranges of this size so they spread across workers
+        self.pages_per_task = pages_per_task
+        # Files of the last load_pdfs / iter_pages run that could not be read in full
+        self.failed_files: List[str] = []
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
-        
-    def load_pdfs(self) -> List[Document]:
-        """Load documents from PDF files in the data directory."""
+
+    def list_pdfs(self) -> List[str]:
+        """PDF filenames in the data directory, sorted so every load sees the same order."""
+        return sorted(f for f in os.listdir(self.data_dir) if f.endswith('.pdf'))
+
+    def _log_failure(self, filename: str, error):
+        print(f"Error loading {filename}: {str(error)}")
+        self.failed_files.append(filename)
+
+    def _make_document(self, text: str, file_path: str, filename: str, page_num: int) -> Document:
+        return Document(
+            page_content=text,
+            metadata={
+                "source": file_path,
+                "page": page_num + 1,
+                "filename": filename,
+                "language": detect_language(text)
+            }
+        )
+
+    def load_pdfs(self, workers: Optional[int] = None, filenames: Optional[List[str]] = None) -> List[Document]:
+        """Load documents from PDF files in the data directory.
+
+        `filenames` restricts loading to a subset of the directory (used by
+        incremental re-indexing).
+
+        With more than one worker (0 means one per CPU), files and page ranges
+        are extracted in a process pool; the returned list is identical to the
+        serial one.
+        """
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
             print(f"Created data directory at {self.data_dir}")
             return []
-            
-        # Load PDFs
+
+        workers = self.workers if workers is None else workers
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+
+        if filenames is None:
+            filenames = self.list_pdfs()
+        else:
+            filenames = sorted(filenames)
+
+        self.failed_files = []
+        if workers > 1:
+            documents = self._load_pdfs_parallel(filenames, workers)
+        else:
+            documents = self._load_pdfs_serial(filenames)
+
+        print(f"Total documents loaded: {len(documents)}")
+        return documents
+
+    def _load_pdfs_serial(self, filenames: List[str]) -> List[Document]:
+        documents = []
+        for filename in filenames:
+            file_path = os.path.join(self.data_dir, filename)
+            try:
+                # Open PDF with PyMuPDF
+                pdf_document = fitz.open(file_path)
+
+                # Extract text from each page
+                for page_num in range(len(pdf_document)):
+                    page = pdf_document[page_num]
+                    text = page.get_text()
+
+                    # Create a Document for each page
+                    documents.append(self._make_document(text, file_path, filename, page_num))
+
+                print(f"Loaded {len(pdf_document)} pages from {filename}")
+                pdf_document.close()
+
+            except Exception as e:
+                self._log_failure(filename, e)
+        return documents
+
+    def _load_pdfs_parallel(self, filenames: List[str], workers: int) -> List[Document]:
+        # Plan page-range tasks per file; opening a PDF to count pages is cheap
+        plans = []
+        for filename in filenames:
+            file_path = os.path.join(self.data_dir, filename)
+            try:
+                with fitz.open(file_path) as pdf_document:
+                    page_count = len(pdf_document)
+            except Exception as e:
+                self._log_failure(filename, e)
+                continue
+            ranges = [
+                (start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)
+            ]
+            plans.append((filename, file_path, page_count, ranges))
+
         documents = []
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.pdf'):
-                file_path = os.path.join(self.data_dir, filename)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                [executor.submit(_extract_page_range, file_path, start, stop) for start, stop in ranges]
+                for _, file_path, _, ranges in plans
+            ]
+            # Collect in submission order so the output order is stable
+            for (filename, file_path, page_count, _), file_futures in zip(plans, futures):
+                for future in file_futures:
+                    try:
+                        pages, error = future.result()
+                    except Exception as e:
+                        pages, error = [], str(e)
+                    documents.extend(
+                        self._make_document(text, file_path, filename, page_num) for page_num, text in pages
+                    )
+                    if error is not None:
+                        # The serial loader stops at the first failing page; skip the later ranges too
+                        self._log_failure(filename, error)
+                        for later in file_futures:
+                            later.cancel()
+                        break
+                else:
+                    print(f"Loaded {page_count} pages from {filename}")
+        return documents
+
+    def iter_pages(self, filenames: Optional[List[str]] = None, workers: Optional[int] = None) -> Iterator[Document]:
+        """Yield one Document per PDF page, in the same order as load_pdfs.
+
+        Only a bounded number of page ranges is in flight at a time, so memory
+        does not grow with the size of the data directory.
+        """
+        if not os.path.exists(self.data_dir):
+            return
+        workers = self.workers if workers is None else workers
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        filenames = self.list_pdfs() if filenames is None else sorted(filenames)
+
+        self.failed_files = []
+        tasks = []
+        for filename in filenames:
+            file_path = os.path.join(self.data_dir, filename)
+            try:
+                with fitz.open(file_path) as pdf_document:
+                    page_count = len(pdf_document)
+            except Exception as e:
+                self._log_failure(filename, e)
+                continue
+            for start in range(0, page_count, self.pages_per_task):
+                tasks.append((filename, file_path, start, min(start + self.pages_per_task, page_count)))
+
+        # A file is dropped from its first failing page on, as in load_pdfs
+        if workers <= 1:
+            for filename, file_path, start, stop in tasks:
+                if filename in self.failed_files:
+                    continue
+                pages, error = _extract_page_range(file_path, start, stop)
+                for page_num, text in pages:
+                    yield self._make_document(text, file_path, filename, page_num)
+                if error is not None:
+                    self._log_failure(filename, error)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            task_iter = iter(tasks)
+            # Keep two tasks per worker queued; results are consumed in order
+            for task in islice(task_iter, workers * 2):
+                pending.append((task, executor.submit(_extract_page_range, *task[1:])))
+            while pending:
+                (filename, file_path, _, _), future = pending.popleft()
+                next_task = next(task_iter, None)
+                if next_task is not None:
+                    pending.append((next_task, executor.submit(_extract_page_range, *next_task[1:])))
                 try:
-                    # Open PDF with PyMuPDF
-                    pdf_document = fitz.open(file_path)
-                    
-                    # Extract text from each page
-                    for page_num in range(len(pdf_document)):
-                        page = pdf_document[page_num]
-                        text = page.get_text()
-                        
-                        # Create a Document for each page
-                        doc = Document(
-                            page_content=text,
-                            metadata={
-                                "source": file_path,
-                                "page": page_num + 1,
-                                "filename": filename
-                            }
-                        )
-                        documents.append(doc)
-                    
-                    print(f"Loaded {len(pdf_document)} pages from {filename}")
-                    pdf_document.close()
-                    
+                    pages, error = future.result()
                 except Exception as e:
-                    print(f"Error loading {filename}: {str(e)}")
-        
-        print(f"Total documents loaded: {len(documents)}")
-        return documents
+                    pages, error = [], str(e)
+                if filename in self.failed_files:
+                    continue
+                for page_num, text in pages:
+                    yield self._make_document(text, file_path, filename, page_num)
+                if error is not None:
+                    self._log_failure(filename, error)
 
     def process_documents(self, documents: List[Document]) -> List[Document]:
         """Process and split documents into chunks."""
@@ -60,11 +245,11 @@ class AivancityDataLoader:
         print(f"Split into {len(processed_docs)} chunks")
         return processed_docs
 
-    def save_documents(self, documents: List[Document], filename: str):
+    def save_documents(self, documents: List[Document], filename: str, append: bool = False):
         """Save processed documents to a file for reference."""
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(filename, 'a' if append else 'w', encoding='utf-8') as f:
             for doc in documents:
                 f.write(f"Content: {doc.page_content}\n")
                 f.write(f"Metadata: {doc.metadata}\n")
-                f.write("-" * 80 + "\n") 
\ No newline at end of file
+                f.write("-" * 80 + "\n")
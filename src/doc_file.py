@@ -0,0 +1,172 @@
+"""
+Pickle-free chunk storage next to the FAISS index.
+`docs.jsonl` holds one JSON record (text and metadata) per chunk and
+`docs.idx` maps vector IDs to (offset, length) in it, sorted by ID. Both are
+memory-mapped and records are decoded only when a search returns them, so
+opening an index costs the same whatever the size of the corpus.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DATA_FILENAME = "docs.jsonl"
+INDEX_FILENAME = "docs.idx"
+INDEX_DTYPE = np.dtype([("id", "<i8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+def _encode(document: Document) -> bytes:
+    record = {"page_content": document.page_content, "metadata": document.metadata}
+    return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _decode(data: bytes) -> Document:
+    record = json.loads(data)
+    return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+
+def write_docs(index_path: str, records: Iterator[Tuple[int, Union[Document, bytes]]]):
+    """Write (vector ID, document or encoded record) pairs, replacing the files atomically."""
+    data_path = os.path.join(index_path, DATA_FILENAME)
+    ids_path = os.path.join(index_path, INDEX_FILENAME)
+    entries = []
+    with open(data_path + ".tmp", "wb") as f:
+        offset = 0
+        for vector_id, record in records:
+            data = record if isinstance(record, bytes) else _encode(record)
+            f.write(data)
+            entries.append((vector_id, offset, len(data)))
+            offset += len(data)
+    entries = np.array(entries, dtype=INDEX_DTYPE)
+    entries.sort(order="id")
+    entries.tofile(ids_path + ".tmp")
+    # Readers that mapped the old files keep their inodes until they reopen
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(ids_path + ".tmp", ids_path)
+
+
+def exists(index_path: str) -> bool:
+    return os.path.exists(os.path.join(index_path, INDEX_FILENAME))
+
+
+class DocFile(Docstore, AddableMixin):
+    """LangChain docstore reading chunks lazily from docs.jsonl/docs.idx.
+
+    Docstore IDs are `str(vector_id)`. Added and deleted chunks are kept in
+    memory until the index is saved again (see `records`).
+    """
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        self._data = None
+        self._index = np.empty(0, dtype=INDEX_DTYPE)
+        data_path = os.path.join(index_path, DATA_FILENAME)
+        if os.path.getsize(data_path):
+            with open(data_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = np.memmap(os.path.join(index_path, INDEX_FILENAME), dtype=INDEX_DTYPE, mode="r")
+        self._added: Dict[int, Document] = {}
+        self._deleted = set()
+
+    def _row(self, vector_id: int) -> Optional[int]:
+        ids = self._index["id"]
+        row = int(np.searchsorted(ids, vector_id))
+        if row < len(ids) and ids[row] == vector_id:
+            return row
+        return None
+
+    def _raw(self, row: int) -> bytes:
+        entry = self._index[row]
+        offset = int(entry["offset"])
+        return self._data[offset:offset + int(entry["length"])]
+
+    def contains(self, vector_id: int) -> bool:
+        if vector_id in self._added:
+            return True
+        return vector_id not in self._deleted and self._row(vector_id) is not None
+
+    def vector_ids(self) -> Iterator[int]:
+        for vector_id in self._index["id"].tolist():
+            if vector_id not in self._deleted and vector_id not in self._added:
+                yield vector_id
+        yield from self._added
+
+    def max_id(self) -> int:
+        """The highest vector ID saved or added, deleted or not; -1 if none."""
+        saved = int(self._index["id"][-1]) if len(self._index) else -1
+        return max(saved, max(self._added, default=-1))
+
+    def __len__(self) -> int:
+        # Added IDs that are also on disk replace those rows
+        return len(self._index) - len(self._deleted) + sum(1 for i in self._added if self._row(i) is None)
+
+    def search(self, search: str) -> Union[str, Document]:
+        vector_id = int(search)
+        if vector_id in self._added:
+            return self._added[vector_id]
+        row = None if vector_id in self._deleted else self._row(vector_id)
+        if row is None:
+            return f"ID {search} not found."
+        return _decode(self._raw(row))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        for docstore_id, document in texts.items():
+            vector_id = int(docstore_id)
+            self._added[vector_id] = document
+            self._deleted.discard(vector_id)
+
+    def delete(self, ids: List) -> None:
+        for docstore_id in ids:
+            vector_id = int(docstore_id)
+            self._added.pop(vector_id, None)
+            if self._row(vector_id) is not None:
+                self._deleted.add(vector_id)
+
+    def records(self, raw: bool = True) -> Iterator[Tuple[int, Union[Document, bytes]]]:
+        """Every live chunk; with `raw`, unchanged ones as their encoded bytes, without decoding."""
+        for row, vector_id in enumerate(self._index["id"].tolist()):
+            if vector_id not in self._deleted and vector_id not in self._added:
+                yield vector_id, self._raw(row) if raw else _decode(self._raw(row))
+        yield from self._added.items()
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+
+class DocIdMap(MutableMapping):
+    """`index_to_docstore_id` view over a DocFile or SQLiteDocstore: vector ID i maps to str(i).
+
+    Keeping a dict of every ID would make loading proportional to the corpus;
+    the docstore already knows which IDs exist, so writes here are no-ops and
+    the docstore's add/delete keep both in sync.
+    """
+
+    def __init__(self, docstore: Docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, vector_id: int) -> str:
+        if not self.docstore.contains(int(vector_id)):
+            raise KeyError(vector_id)
+        return str(vector_id)
+
+    def __setitem__(self, vector_id: int, docstore_id: str):
+        if docstore_id != str(vector_id):
+            raise ValueError("Docstore IDs of a DocFile must be str(vector_id)")
+
+    def __delitem__(self, vector_id: int):
+        if not self.docstore.contains(int(vector_id)):
+            raise KeyError(vector_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return self.docstore.vector_ids()
+
+    def __len__(self) -> int:
+        return len(self.docstore)
@@ -0,0 +1,115 @@
+"""
+Persistent embedding cache for index builds.
+Vectors are keyed by (model name, hash of the normalized chunk text) and
+stored per model as a raw float32 matrix plus a fixed-width offsets index,
+so lookups never unpickle anything and the matrix is read through mmap.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# One record per cached vector: 16-byte text digest -> row in the float32 matrix
+_INDEX_DTYPE = np.dtype([("key", "u1", (16,)), ("row", "<u8")])
+
+
+class EmbeddingCache:
+    """Append-only on-disk cache of chunk embeddings for one model."""
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.meta_path = os.path.join(cache_dir, f"{slug}.json")
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.idx")
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._rows: Dict[bytes, int] = {}
+        self._row_count = 0
+        self._vectors = None
+        self._load()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # Whitespace runs do not change the tokens the encoder sees
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def key(cls, text: str) -> bytes:
+        return hashlib.blake2b(cls.normalize(text).encode("utf-8"), digest_size=16).digest()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        row_bytes = self.dim * 4
+        if os.path.exists(self.vectors_path):
+            self._row_count = os.path.getsize(self.vectors_path) // row_bytes
+        records = np.fromfile(self.index_path, dtype=_INDEX_DTYPE) if os.path.exists(self.index_path) else []
+        for record in records:
+            # Ignore index entries whose vector was never fully written
+            if record["row"] < self._row_count:
+                self._rows[record["key"].tobytes()] = int(record["row"])
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = np.memmap(self.vectors_path, dtype="float32", mode="r").reshape(-1, self.dim)
+        return self._vectors
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, keys: List[bytes]) -> Tuple[List[int], np.ndarray]:
+        """Return the positions in `keys` that are cached and their vectors."""
+        positions = [i for i, key in enumerate(keys) if key in self._rows]
+        self.hits += len(positions)
+        self.misses += len(keys) - len(positions)
+        if not positions:
+            return [], np.empty((0, self.dim or 0), dtype="float32")
+        rows = [self._rows[keys[i]] for i in positions]
+        return positions, np.asarray(self._matrix()[rows], dtype="float32")
+
+    def put(self, keys: List[bytes], vectors: np.ndarray):
+        """Append vectors for keys that are not cached yet."""
+        vectors = np.asarray(vectors, dtype="float32")
+        if self.dim is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.dim = int(vectors.shape[1])
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+        new_keys, new_rows = [], []
+        for key, vector in zip(keys, vectors):
+            if key in self._rows:
+                continue
+            self._rows[key] = self._row_count + len(new_keys)
+            new_keys.append(key)
+            new_rows.append(vector)
+        if not new_keys:
+            return
+        records = np.empty(len(new_keys), dtype=_INDEX_DTYPE)
+        records["key"] = np.frombuffer(b"".join(new_keys), dtype="u1").reshape(-1, 16)
+        records["row"] = np.arange(self._row_count, self._row_count + len(new_keys))
+        # Vectors first, then the index, so a crash never indexes a missing row
+        with open(self.vectors_path, "ab") as f:
+            np.asarray(new_rows, dtype="float32").tofile(f)
+        with open(self.index_path, "ab") as f:
+            records.tofile(f)
+        self._row_count += len(new_keys)
+        self._vectors = None
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        return (f"{self.hits} hits / {self.hits + self.misses} lookups "
+                f"({self.hit_rate:.1%}), {len(self)} vectors cached")
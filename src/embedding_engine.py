@@ -0,0 +1,92 @@
+"""
+Batched document encoder for index builds.
+Wraps the SentenceTransformer behind `HuggingFaceEmbeddings` with a tunable
+batch size, length-sorted batching to minimise padding, an optional
+multi-process encode pool and a chunks/sec meter. Other LangChain embedding
+backends (e.g. ONNX) are batched through their own `embed_documents`.
+"""
+
+import logging
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine:
+    """Encodes chunk texts exactly like HuggingFaceEmbeddings.embed_documents, only faster."""
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 64, processes: int = 1,
+                 show_progress: bool = True):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        # 0 means one encode process per CPU core, 1 encodes in this process
+        self.processes = processes if processes > 0 else (os.cpu_count() or 1)
+        self._sentence_transformer = isinstance(embeddings, HuggingFaceEmbeddings)
+        if self.processes > 1 and not self._sentence_transformer:
+            logger.warning("Multi-process encoding needs a HuggingFaceEmbeddings backend, encoding in-process")
+            self.processes = 1
+        self.show_progress = show_progress
+        self._pool = None
+
+    def _start_pool(self):
+        if self._pool is None:
+            logger.info(f"Starting {self.processes} encode processes...")
+            self._pool = self.embeddings.client.start_multi_process_pool(["cpu"] * self.processes)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self.embeddings.client.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 matrix, in input order."""
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        # Same preprocessing and encode options as HuggingFaceEmbeddings.embed_documents
+        texts = [text.replace("\n", " ") for text in texts]
+        normalize = getattr(self.embeddings, "encode_kwargs", {}).get("normalize_embeddings", False)
+
+        # Longest first, so every batch holds texts of similar length and little padding
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+
+        # Work is handed out in groups so the meter can report progress
+        group_size = self.batch_size * self.processes * 4
+        parts = []
+        start = time.perf_counter()
+        for offset in range(0, len(sorted_texts), group_size):
+            group = sorted_texts[offset:offset + group_size]
+            if not self._sentence_transformer:
+                part = self.embeddings.embed_documents(group)
+            elif self.processes > 1:
+                part = self.embeddings.client.encode_multi_process(
+                    group, self._start_pool(), batch_size=self.batch_size, normalize_embeddings=normalize,
+                )
+            else:
+                part = self.embeddings.client.encode(
+                    group, batch_size=self.batch_size, normalize_embeddings=normalize, show_progress_bar=False,
+                )
+            parts.append(np.asarray(part, dtype="float32"))
+            self._report(offset + len(group), len(texts), time.perf_counter() - start)
+
+        vectors = np.empty((len(texts), parts[0].shape[1]), dtype="float32")
+        vectors[order] = np.concatenate(parts)
+        return vectors
+
+    def _report(self, done: int, total: int, seconds: float):
+        rate = done / seconds if seconds > 0 else 0.0
+        message = f"Encoded {done}/{total} chunks ({rate:.1f} chunks/s)"
+        if self.show_progress:
+            end = "\n" if done == total else ""
+            sys.stdout.write(f"\r{message}{end}")
+            sys.stdout.flush()
+        if done == total:
+            logger.info(message)
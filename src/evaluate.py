@@ -113,13 +113,19 @@ class RAGEvaluator:
     def evaluate_retrieval(
         self, 
         question: str, 
-        k: int = 3
+        k: int = 3,
+        docs: Optional[List[Document]] = None
     ) -> Dict[str, Any]:
-        """Evaluate the quality of document retrieval."""
+        """Evaluate the quality of document retrieval.
+
+        `docs` are documents already retrieved for the question (e.g. by
+        `retrieve_many`); by default they are retrieved here.
+        """
         logger.info(f"Evaluating retrieval for question: {question[:100]}...")
         
         # Get retrieved documents
-        docs = self.rag.retrieve(question, k=k)
+        if docs is None:
+            docs = self.rag.retrieve(question, k=k)
         
         # Format documents for evaluation
         docs_text = "\n\n".join(
@@ -167,15 +173,18 @@ class RAGEvaluator:
         """Run full pipeline evaluation on a set of test cases."""
         logger.info(f"Starting pipeline evaluation with {len(test_cases)} test cases...")
         
+        # Retrieve for every question at once: one embedding batch and one index search
+        retrieved = self.rag.retrieve_many([test_case["question"] for test_case in test_cases], k=3)
+
         results = []
-        for i, test_case in enumerate(test_cases, 1):
+        for i, (test_case, docs) in enumerate(zip(test_cases, retrieved), 1):
             logger.info(f"Processing test case {i}/{len(test_cases)}...")
             
             question = test_case["question"]
             expected_answer = test_case.get("expected_answer")
             
             # Evaluate retrieval
-            retrieval_results = self.evaluate_retrieval(question)
+            retrieval_results = self.evaluate_retrieval(question, docs=docs)
             
             # Get system's answer using retrieved context
             context = "\n\n".join(retrieval_results["documents"])
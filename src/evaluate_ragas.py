@@ -99,9 +99,11 @@ async def main():
     print("Initializing agent...")
     agent = AivancityAgent(rag_system=rag_system, model_name="gpt-3.5-turbo")
 
+    # Retrieve for all queries at once: one embedding batch and one index search
+    retrieved = dict(zip(DEV_QUERIES, rag_system.retrieve_many(DEV_QUERIES)))
+
     async def run_query(q: str):
-        # run retrieval
-        docs = rag_system.retrieve(q)
+        docs = retrieved[q]
         context_chunks = [d.page_content for d in docs]
 
         # generate answer (sync invoke for simplicity)
@@ -0,0 +1,124 @@
+"""
+Versioned index directories.
+Every build is saved to its own directory under the index root (e.g.
+data/faiss_index/v20261016-122400) and published by atomically rewriting
+data/faiss_index/CURRENT. Running apps never see a half-written index, and an
+`IndexWatcher` switches them to each new version without a restart.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+# Versions kept on disk, for rollback and for apps that have not switched yet
+KEEP_VERSIONS = 3
+# Files of an index saved directly in the root, before versioning
+UNVERSIONED_FILES = ("index.faiss", "index.pkl", "vectors.f32", "docs.sqlite", "docs.jsonl", "docs.idx",
+                     "manifest.json")
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(root: str) -> Tuple[str, Optional[str]]:
+    """(directory to load, version) for an index root; unversioned roots load as-is."""
+    version = current_version(root)
+    if version is None:
+        return root, None
+    return os.path.join(root, version), version
+
+
+def new_version(root: str) -> str:
+    """Create an empty directory for the next version and return its name."""
+    base = time.strftime("v%Y%m%d-%H%M%S")
+    version, n = base, 1
+    while os.path.exists(os.path.join(root, version)):
+        n += 1
+        version = f"{base}-{n}"
+    os.makedirs(os.path.join(root, version))
+    return version
+
+
+def publish(root: str, version: str):
+    """Make `version` the current one, atomically."""
+    path = os.path.join(root, CURRENT_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def prune(root: str, keep: int = KEEP_VERSIONS):
+    """Delete all but the `keep` newest versions, and the files of an unversioned index."""
+    current = current_version(root)
+    versions = sorted(
+        name for name in os.listdir(root)
+        if name.startswith("v") and os.path.isdir(os.path.join(root, name))
+    )
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            # Processes that still map its files keep them until they switch
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    if current is not None:
+        for filename in UNVERSIONED_FILES:
+            if os.path.exists(os.path.join(root, filename)):
+                os.remove(os.path.join(root, filename))
+
+
+class IndexWatcher:
+    """Polls CURRENT in the background and hot-swaps a RAGSystem onto new versions."""
+
+    def __init__(self, rag_system, root: str = "data/faiss_index", interval: float = 10.0):
+        self.rag_system = rag_system
+        self.root = root
+        self.interval = interval
+        self._failed_version: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Load the current version if it is not the active one; returns True on a swap."""
+        version = current_version(self.root)
+        if version is None or version in (self.rag_system.index_version, self._failed_version):
+            return False
+        previous = self.rag_system.index_version
+        start = time.perf_counter()
+        try:
+            self.rag_system.load_index(self.root)
+        except Exception:
+            # A version that fails to load leaves the active one serving; it is not retried
+            self._failed_version = version
+            raise
+        logger.info(f"Swapped index {previous} -> {self.rag_system.index_version} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception(f"Could not load index version {self._failed_version}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,106 @@
+"""
+Streaming ingestion pipeline.
+Runs extract -> split -> embed -> add over bounded batches of PDF pages, so
+peak memory depends on the batch size rather than on the size of the corpus.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from data_loader import AivancityDataLoader
+from manifest import IndexManifest
+from rag import RAGSystem
+
+
+class StageMeter:
+    """Accumulates item counts and wall time per pipeline stage."""
+
+    def __init__(self):
+        self.items: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str, items: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, items, time.perf_counter() - start)
+
+    def add(self, stage: str, items: int, seconds: float):
+        self.items[stage] = self.items.get(stage, 0) + items
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def rate(self, stage: str) -> float:
+        seconds = self.seconds.get(stage, 0.0)
+        return self.items.get(stage, 0) / seconds if seconds > 0 else 0.0
+
+    def report(self) -> str:
+        return " | ".join(
+            f"{stage}: {self.items[stage]} ({self.rate(stage):.1f}/s)" for stage in self.items
+        )
+
+
+def _batched_pages(pages: Iterator[Document], batch_size: int, meter: StageMeter) -> Iterator[List[Document]]:
+    batch: List[Document] = []
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        if page is not None:
+            meter.add("extract", 1, time.perf_counter() - start)
+            batch.append(page)
+        if batch and (page is None or len(batch) >= batch_size):
+            yield batch
+            batch = []
+        if page is None:
+            return
+
+
+def stream_ingest(
+    data_loader: AivancityDataLoader,
+    rag_system: RAGSystem,
+    batch_size: int = 64,
+    filenames: Optional[List[str]] = None,
+    dump_path: Optional[str] = None,
+    index_path: Optional[str] = None,
+) -> List[Tuple[str, str, int]]:
+    """Index PDFs page batch by page batch into a new index in `rag_system`.
+
+    With `index_path`, each batch's chunks and vectors are written to the
+    chunk store and vectors.f32 there as soon as they are embedded (save the
+    index to the same path to commit them). Returns (filename, chunk hash,
+    vector ID) for every indexed chunk, which is what the manifest needs;
+    chunk text is not kept.
+    """
+    if index_path is not None:
+        rag_system.start_build(index_path)
+    meter = StageMeter()
+    indexed: List[Tuple[str, str, int]] = []
+    if dump_path:
+        # Start a fresh reference dump; batches are appended to it
+        data_loader.save_documents([], dump_path)
+
+    pages = data_loader.iter_pages(filenames=filenames)
+    for batch in _batched_pages(pages, batch_size, meter):
+        with meter.measure("split", len(batch)):
+            chunks = data_loader.text_splitter.split_documents(batch)
+        if not chunks:
+            continue
+        if dump_path:
+            data_loader.save_documents(chunks, dump_path, append=True)
+
+        with meter.measure("embed", len(chunks)):
+            vectors = rag_system.embed_documents([chunk.page_content for chunk in chunks])
+        with meter.measure("add", len(chunks)):
+            ids = rag_system.add_embeddings(chunks, vectors)
+
+        indexed.extend(
+            (chunk.metadata["filename"], IndexManifest.chunk_hash(chunk), vector_id)
+            for chunk, vector_id in zip(chunks, ids)
+        )
+        print(f"Indexed {len(indexed)} chunks -- {meter.report()}")
+
+    return indexed
@@ -1,39 +1,236 @@
 from data_loader import AivancityDataLoader
+from ingest import stream_ingest
+import index_versions
+from manifest import IndexManifest
 from rag import RAGSystem
+from vector_index import index_type_of
+from typing import Dict, List, Optional
+import argparse
 import os
+import shutil
+
+INDEX_PATH = "data/faiss_index"
+
+def _group_by_file(chunks) -> Dict[str, List]:
+    by_file: Dict[str, List] = {}
+    for chunk in chunks:
+        by_file.setdefault(chunk.metadata["filename"], []).append(chunk)
+    return by_file
+
+def _file_hashes(data_loader: AivancityDataLoader) -> Dict[str, str]:
+    return {
+        filename: IndexManifest.file_hash(os.path.join(data_loader.data_dir, filename))
+        for filename in data_loader.list_pdfs()
+    }
+
+def update_rag(data_loader: AivancityDataLoader, rag_system: RAGSystem, index_path: str = INDEX_PATH):
+    """Bring an existing index in line with the data directory.
+
+    Only new or changed PDFs are extracted and chunked; chunks whose hash is
+    unchanged keep their vectors, new chunks are embedded and inserted, and
+    vectors of removed files or dropped chunks are deleted. The result is
+    published as a new version of `index_path`.
+    """
+    manifest = IndexManifest.load(index_versions.resolve(index_path)[0])
+    rag_system.load_index(index_path)
+
+    current = _file_hashes(data_loader)
+    added, changed, removed = manifest.diff(current)
+    if not (added or changed or removed):
+        previous_type = index_type_of(rag_system.vector_store.index)
+        index_type = rag_system.finalize_index()
+        if index_type != previous_type or rag_system.bm25 is None:
+            if index_type != previous_type:
+                print(f"Converted the {previous_type} index to {index_type}.")
+            else:
+                print("Building the BM25 keyword index...")
+            _publish(rag_system, manifest, index_path)
+        else:
+            print("Index is up to date, nothing to re-index.")
+        return rag_system
+    print(f"Files added: {len(added)}, changed: {len(changed)}, removed: {len(removed)}")
+
+    stale_ids: List[int] = []
+    for filename in removed:
+        stale_ids.extend(manifest.remove_file(filename))
+
+    to_load = added + changed
+    chunks_by_file: Dict[str, List] = {}
+    loaded: List[str] = []
+    if to_load:
+        print(f"Loading {len(to_load)} new or changed PDFs...")
+        documents = data_loader.load_pdfs(filenames=to_load)
+        pages_by_file = _group_by_file(documents)
+        # Files that failed to extract keep their old entry and vectors, so the next run retries them
+        loaded = [f for f in to_load if f in pages_by_file and f not in data_loader.failed_files]
+        if len(loaded) < len(to_load):
+            print(f"Skipping {len(to_load) - len(loaded)} PDFs that could not be read; they will be retried")
+        chunks_by_file = _group_by_file(data_loader.process_documents(documents))
+
+    new_chunks = []
+    entries: Dict[str, List] = {}
+    for filename in loaded:
+        old_ids = manifest.chunk_ids(filename)
+        file_entries = entries.setdefault(filename, [])
+        for chunk in chunks_by_file.get(filename, []):
+            chunk_hash = IndexManifest.chunk_hash(chunk)
+            if old_ids.get(chunk_hash):
+                # Same text on the same page: keep the existing vector
+                file_entries.append([chunk_hash, old_ids[chunk_hash].pop()])
+            else:
+                file_entries.append([chunk_hash, None])
+                new_chunks.append((file_entries[-1], chunk))
+        for ids in old_ids.values():
+            stale_ids.extend(ids)
+
+    print(f"Embedding {len(new_chunks)} new chunks...")
+    new_ids = rag_system.add_documents([chunk for _, chunk in new_chunks])
+    for (entry, _), vector_id in zip(new_chunks, new_ids):
+        entry[1] = vector_id
+    for filename, file_entries in entries.items():
+        manifest.set_file(filename, current[filename], [tuple(entry) for entry in file_entries])
+
+    print(f"Deleting {len(stale_ids)} stale vectors...")
+    rag_system.delete_documents(stale_ids)
+
+    print(f"Index type: {rag_system.finalize_index()}")
+    _publish(rag_system, manifest, index_path)
+    return rag_system
+
+def _publish(rag_system: RAGSystem, manifest: IndexManifest, index_path: str = INDEX_PATH,
+             version: Optional[str] = None):
+    """Save the index and its manifest as a new version (or `version`) and make it the current one."""
+    version = version or index_versions.new_version(index_path)
+    version_path = os.path.join(index_path, version)
+    rag_system.save_index(version_path)
+    manifest.save(version_path)
+    # Running apps pick the new version up from here
+    index_versions.publish(index_path, version)
+    # Later updates in this process start from, and compare against, the published version
+    rag_system.index_path, rag_system.index_version = version_path, version
+    index_versions.prune(index_path)
+    print(f"Published index version {version}")
+
+def _build_manifest(rag_system: RAGSystem, data_loader: AivancityDataLoader, indexed) -> IndexManifest:
+    """Manifest of a full build from (filename, chunk hash, vector ID) triples."""
+    manifest = IndexManifest(model_name=rag_system.embedding_id)
+    current = _file_hashes(data_loader)
+    entries: Dict[str, List] = {}
+    for filename, chunk_hash, vector_id in indexed:
+        entries.setdefault(filename, []).append((chunk_hash, vector_id))
+    for filename, file_entries in entries.items():
+        manifest.set_file(filename, current[filename], file_entries)
+    return manifest
+
+def _report_embedding_cache(rag_system: RAGSystem):
+    if rag_system.embedding_cache is not None:
+        print(f"Embedding cache: {rag_system.embedding_cache.stats()}")
+
+def _build(data_loader: AivancityDataLoader, rag_system: RAGSystem, full: bool, stream: bool, batch_size: int):
+    """Incremental update when possible, otherwise a full (optionally streaming) build."""
+    current_path = index_versions.resolve(INDEX_PATH)[0]
+    if not full and IndexManifest.exists(current_path):
+        manifest = IndexManifest.load(current_path)
+        if manifest.model_name == rag_system.embedding_id:
+            print("Existing index found, re-indexing changed PDFs only...")
+            update_rag(data_loader, rag_system, INDEX_PATH)
+            _report_embedding_cache(rag_system)
+            print("\nRAG system updated successfully!")
+            return rag_system
+        print("Index was built with a different embedding model, rebuilding from scratch...")
+
+    version = None
+    if stream:
+        print(f"Streaming PDFs into the index in batches of {batch_size} pages...")
+        # Chunks and vectors go straight to the new version's directory
+        version = index_versions.new_version(INDEX_PATH)
+        indexed = stream_ingest(data_loader, rag_system, batch_size=batch_size,
+                                dump_path="data/processed_documents.txt",
+                                index_path=os.path.join(INDEX_PATH, version))
+        if not indexed:
+            shutil.rmtree(os.path.join(INDEX_PATH, version), ignore_errors=True)
+            print("No PDFs found in the data directory. Please add PDF files to the 'data' directory.")
+            return None
+    else:
+        print("Loading PDFs from data directory...")
+        documents = data_loader.load_pdfs()
+
+        if not documents:
+            print("No PDFs found in the data directory. Please add PDF files to the 'data' directory.")
+            return None
+
+        # Process documents
+        print("Processing documents...")
+        processed_docs = data_loader.process_documents(documents)
+
+        data_loader.save_documents(processed_docs, "data/processed_documents.txt")
+
+        print("Indexing documents...")
+        ids = rag_system.index_documents(processed_docs)
+        indexed = [
+            (chunk.metadata["filename"], IndexManifest.chunk_hash(chunk), vector_id)
+            for chunk, vector_id in zip(processed_docs, ids)
+        ]
+
+    # Streaming builds add into a flat index; convert it to the configured type
+    print(f"Index type: {rag_system.finalize_index()}")
+
+    # Save the index, with a record of what was indexed so the next run can be incremental
+    _publish(rag_system, _build_manifest(rag_system, data_loader, indexed), version=version)
+    _report_embedding_cache(rag_system)
 
-def initialize_rag():
-    os.makedirs("data", exist_ok=True)
-    
-    # Initialize components
-    data_loader = AivancityDataLoader()
-    rag_system = RAGSystem()
-    
-    print("Loading PDFs from data directory...")
-    documents = data_loader.load_pdfs()
-    
-    if not documents:
-        print("No PDFs found in the data directory. Please add PDF files to the 'data' directory.")
-        return None
-    
-    # Process documents
-    print("Processing documents...")
-    processed_docs = data_loader.process_documents(documents)
-    
-    data_loader.save_documents(processed_docs, "data/processed_documents.txt")
-    
-    print("Indexing documents...")
-    rag_system.index_documents(processed_docs)
-    
-    # Save the index
-    rag_system.save_index("data/faiss_index")
-    
     print("\nRAG system initialized successfully!")
-    print(f"Total documents processed: {len(processed_docs)}")
+    print(f"Total documents processed: {len(indexed)}")
     print("\nYou can now run the test script with:")
     print("poetry run python src/test_rag.py")
-    
+
     return rag_system
 
+def initialize_rag(workers: int = 1, full: bool = False, stream: bool = False, batch_size: int = 64,
+                   embedding_cache: bool = True, encode_batch_size: int = 64, encode_processes: int = 1,
+                   index_type: Optional[str] = None, index_report: bool = False):
+    os.makedirs("data", exist_ok=True)
+
+    # Initialize components
+    data_loader = AivancityDataLoader(workers=workers)
+    rag_system = RAGSystem(
+        embedding_cache_dir="data/embedding_cache" if embedding_cache else None,
+        encode_batch_size=encode_batch_size,
+        encode_processes=encode_processes,
+        index_type=index_type,
+    )
+    try:
+        result = _build(data_loader, rag_system, full=full, stream=stream, batch_size=batch_size)
+    finally:
+        rag_system.close()
+    if result is not None and index_report:
+        print("\nRecall vs latency against an exact scan:")
+        print(rag_system.index_report())
+    return result
+
 if __name__ == "__main__":
-    initialize_rag() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the Aivancity FAISS index from the PDFs in data/")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used for PDF extraction (0 = one per CPU, 1 = serial)")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild the whole index instead of re-indexing changed PDFs only")
+    parser.add_argument("--stream", action="store_true",
+                        help="Build the index in bounded page batches (extract -> split -> embed -> add)")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Pages per batch in streaming mode")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Re-encode every chunk instead of reusing data/embedding_cache")
+    parser.add_argument("--encode-batch-size", type=int, default=64,
+                        help="Chunks per forward pass of the embedding model")
+    parser.add_argument("--encode-processes", type=int, default=1,
+                        help="Embedding processes (0 = one per CPU core, 1 = encode in this process)")
+    parser.add_argument("--index-type", choices=["auto", "flat", "hnsw", "ivf", "ivfpq", "sq8"], default=None,
+                        help="FAISS index type (default: INDEX_TYPE env var, else auto from corpus size); "
+                             "ivfpq and sq8 are compressed for low-memory deployments")
+    parser.add_argument("--index-report", action="store_true",
+                        help="Print recall@5, latency and bytes per vector of the built index against an exact scan")
+    args = parser.parse_args()
+    initialize_rag(workers=args.workers, full=args.full, stream=args.stream, batch_size=args.batch_size,
+                   embedding_cache=not args.no_embedding_cache, encode_batch_size=args.encode_batch_size,
+                   encode_processes=args.encode_processes, index_type=args.index_type,
+                   index_report=args.index_report)
@@ -0,0 +1,160 @@
+"""
+Local intent classifier in front of the LLM router.
+A nearest-centroid classifier over the query embedding (already computed for
+retrieval) sorts turns into chit-chat, knowledge-base questions and questions
+that need the web. Only turns it is unsure about are sent to the LLM.
+
+python src/intent_classifier.py train          # fit on data/intent_examples.jsonl and save
+python src/intent_classifier.py eval [--llm]   # leave-one-out accuracy, optionally vs the LLM router
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LABELS = ("chitchat", "knowledge_base", "web")
+# Route of the agent graph for each intent
+ROUTES = {"chitchat": "generate", "knowledge_base": "generate", "web": "search"}
+EXAMPLES_PATH = "data/intent_examples.jsonl"
+MODEL_PATH = "data/intent_classifier.npz"
+
+
+def load_examples(path: str = EXAMPLES_PATH) -> Tuple[List[str], List[str]]:
+    """(texts, labels) from a JSONL file of {"text": ..., "label": ...} lines."""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                if example["label"] not in LABELS:
+                    raise ValueError(f"Unknown intent label: {example['label']}")
+                texts.append(example["text"])
+                labels.append(example["label"])
+    return texts, labels
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype="float32"))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class IntentClassifier:
+    """Nearest centroid on cosine similarity, with softmax probabilities."""
+
+    def __init__(self, centroids: np.ndarray, model_name: str, temperature: float = 20.0,
+                 min_confidence: float = 0.8):
+        self.centroids = _normalize(centroids)
+        # Embedding model the centroids were computed with; other models' vectors do not compare
+        self.model_name = model_name
+        self.temperature = temperature
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, labels: Sequence[str], model_name: str, **kwargs) -> "IntentClassifier":
+        vectors = _normalize(vectors)
+        labels = np.asarray(labels)
+        missing = [label for label in LABELS if not (labels == label).any()]
+        if missing:
+            raise ValueError(f"No examples for intents: {missing}")
+        centroids = np.stack([vectors[labels == label].mean(axis=0) for label in LABELS])
+        return cls(centroids, model_name, **kwargs)
+
+    def probabilities(self, vectors: np.ndarray) -> np.ndarray:
+        logits = self.temperature * (_normalize(vectors) @ self.centroids.T)
+        logits -= logits.max(axis=1, keepdims=True)
+        weights = np.exp(logits)
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def predict(self, vector: np.ndarray) -> Tuple[str, float]:
+        """(intent, probability) of one query vector."""
+        probabilities = self.probabilities(vector)[0]
+        best = int(np.argmax(probabilities))
+        return LABELS[best], float(probabilities[best])
+
+    def route(self, vector: np.ndarray) -> Optional[str]:
+        """"generate" or "search" when confident, else None (ask the LLM)."""
+        intent, probability = self.predict(vector)
+        return ROUTES[intent] if probability >= self.min_confidence else None
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, centroids=self.centroids, model_name=np.array(self.model_name),
+                 temperature=np.array(self.temperature))
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH, min_confidence: float = 0.8) -> Optional["IntentClassifier"]:
+        """The saved classifier, or None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["centroids"], str(data["model_name"]), float(data["temperature"]), min_confidence)
+
+
+def leave_one_out(vectors: np.ndarray, labels: Sequence[str], model_name: str,
+                  min_confidence: float) -> List[Tuple[str, float]]:
+    """Prediction for each example from a classifier fitted on all the others."""
+    predictions = []
+    for i in range(len(labels)):
+        rest = [j for j in range(len(labels)) if j != i]
+        classifier = IntentClassifier.fit(vectors[rest], [labels[j] for j in rest], model_name,
+                                          min_confidence=min_confidence)
+        predictions.append(classifier.predict(vectors[i]))
+    return predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--examples", default=EXAMPLES_PATH)
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--min-confidence", type=float, default=float(os.getenv("INTENT_CONFIDENCE", 0.8)))
+    parser.add_argument("--llm", action="store_true", help="Also ask the LLM router (needs API keys)")
+    args = parser.parse_args()
+
+    from rag import RAGSystem
+
+    texts, labels = load_examples(args.examples)
+    rag_system = RAGSystem(embedding_cache_dir=None)
+    vectors = rag_system.embed_queries(texts)
+
+    if args.command == "train":
+        classifier = IntentClassifier.fit(vectors, labels, rag_system.model_name)
+        classifier.save(args.output)
+        print(f"Trained on {len(texts)} examples; saved to {args.output}")
+        return
+
+    predictions = leave_one_out(vectors, labels, rag_system.model_name, args.min_confidence)
+    correct = sum(intent == label for (intent, _), label in zip(predictions, labels))
+    confident = [(intent, label) for (intent, probability), label in zip(predictions, labels)
+                 if probability >= args.min_confidence]
+    confident_correct = sum(ROUTES[intent] == ROUTES[label] for intent, label in confident)
+    print(f"Leave-one-out intent accuracy: {correct}/{len(labels)} ({correct / len(labels):.1%})")
+    print(f"Confident on {len(confident)}/{len(labels)} turns (LLM skipped), "
+          f"route correct on {confident_correct}/{len(confident)}")
+
+    if args.llm:
+        rag_system.load_index("data/faiss_index")
+        from agent import AivancityAgent
+        agent = AivancityAgent(rag_system)
+
+        async def llm_routes() -> List[str]:
+            routes = []
+            for text in texts:
+                docs = rag_system.retrieve(text, k=agent.context_k)
+                decision = await agent._ashould_use_search(docs, text)
+                routes.append("generate" if decision == "yes" else "search")
+            return routes
+
+        routes = asyncio.run(llm_routes())
+        llm_correct = sum(route == ROUTES[label] for route, label in zip(routes, labels))
+        agreement = sum(ROUTES[intent] == route for (intent, _), route in zip(predictions, routes))
+        print(f"LLM router route accuracy: {llm_correct}/{len(labels)} ({llm_correct / len(labels):.1%})")
+        print(f"Classifier agrees with the LLM router on {agreement}/{len(labels)} turns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Index manifest for incremental re-indexing.
+Records, for every indexed PDF, its content hash and the hash and vector ID
+of each chunk it produced. The manifest lives next to the FAISS index.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+
+class IndexManifest:
+    """File hashes, chunk hashes and vector IDs of an index on disk."""
+
+    FILENAME = "manifest.json"
+
+    def __init__(self, model_name: str = "", files: Dict[str, Dict] = None):
+        self.model_name = model_name
+        # filename -> {"hash": str, "chunks": [{"hash": str, "id": int}, ...]}
+        self.files = files or {}
+
+    @classmethod
+    def exists(cls, index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, cls.FILENAME))
+
+    @classmethod
+    def load(cls, index_path: str) -> "IndexManifest":
+        with open(os.path.join(index_path, cls.FILENAME), encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(model_name=data.get("model_name", ""), files=data.get("files", {}))
+
+    def save(self, index_path: str):
+        os.makedirs(index_path, exist_ok=True)
+        path = os.path.join(index_path, self.FILENAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "files": self.files}, f, indent=1)
+        # Replace atomically so an interrupted run never leaves a truncated manifest
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_hash(document: Document) -> str:
+        """Hash a chunk's text together with its page, so moved text is re-indexed."""
+        digest = hashlib.sha256()
+        digest.update(str(document.metadata.get("page", "")).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(document.page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def diff(self, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """Compare {filename: hash} of the data directory with the manifest.
+
+        Returns (added, changed, removed) filenames.
+        """
+        added = sorted(f for f in current if f not in self.files)
+        changed = sorted(f for f in current if f in self.files and self.files[f]["hash"] != current[f])
+        removed = sorted(f for f in self.files if f not in current)
+        return added, changed, removed
+
+    def chunk_ids(self, filename: str) -> Dict[str, List[int]]:
+        """Map chunk hash -> vector IDs for a file already in the manifest."""
+        ids: Dict[str, List[int]] = {}
+        for chunk in self.files.get(filename, {}).get("chunks", []):
+            ids.setdefault(chunk["hash"], []).append(chunk["id"])
+        return ids
+
+    def set_file(self, filename: str, file_hash: str, chunks: List[Tuple[str, int]]):
+        self.files[filename] = {
+            "hash": file_hash,
+            "chunks": [{"hash": h, "id": vector_id} for h, vector_id in chunks],
+        }
+
+    def remove_file(self, filename: str) -> List[int]:
+        """Drop a file from the manifest and return the vector IDs it owned."""
+        entry = self.files.pop(filename, None)
+        if not entry:
+            return []
+        return [chunk["id"] for chunk in entry["chunks"]]
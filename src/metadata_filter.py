@@ -0,0 +1,41 @@
+"""
+Metadata filters for retrieval.
+A filter keeps chunks whose filename, source or language is one of the
+given values and whose page lies in an inclusive (first, last) range; a
+criterion left out matches every chunk.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+Values = Union[str, Sequence[str], None]
+VALUE_FIELDS = ("filename", "source", "language")
+
+
+def build_filters(filename: Values = None, source: Values = None,
+                  page_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                  language: Values = None) -> Optional[Dict]:
+    """Normalized filters, or None when nothing is filtered."""
+    filters = {}
+    for field, value in zip(VALUE_FIELDS, (filename, source, language)):
+        if value is not None:
+            filters[field] = (value,) if isinstance(value, str) else tuple(value)
+    if page_range is not None:
+        first, last = page_range
+        filters["page_range"] = (first, last)
+    return filters or None
+
+
+def cache_key(filters: Dict) -> Tuple:
+    return tuple(sorted(filters.items()))
+
+
+def matches(metadata: Dict, filters: Dict) -> bool:
+    for field in VALUE_FIELDS:
+        if field in filters and metadata.get(field) not in filters[field]:
+            return False
+    if "page_range" in filters:
+        first, last = filters["page_range"]
+        page = metadata.get("page")
+        if page is None or (first is not None and page < first) or (last is not None and page > last):
+            return False
+    return True
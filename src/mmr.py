@@ -0,0 +1,59 @@
+"""
+Maximal marginal relevance (MMR) diversification of retrieved chunks.
+The corpus holds several copies of some PDFs, so the most similar chunks are
+often the same text more than once. MMR picks chunks one at a time, trading
+similarity to the query against similarity to the chunks already picked.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+from bm25_index import TOKEN_RE
+
+# Token n-grams already seen in earlier chunks count as duplicated context
+SHINGLE_SIZE = 8
+
+
+def maximal_marginal_relevance(query: np.ndarray, vectors: np.ndarray, k: int,
+                               lambda_mult: float = 0.5) -> List[int]:
+    """Positions in `vectors` of the k picked chunks, in pick order.
+
+    Each pick maximizes lambda * sim(query, c) - (1 - lambda) * max sim(c, picked),
+    with cosine similarities; lambda 1 is plain relevance order.
+    """
+    if not len(vectors):
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    # Highest similarity of each candidate to any picked chunk
+    redundancy = np.full(len(vectors), -np.inf, dtype="float32")
+    available = np.ones(len(vectors), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(vectors))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy if picked else relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+def duplicate_tokens(texts: Sequence[str], n: int = SHINGLE_SIZE) -> int:
+    """Tokens of `texts` covered by an n-gram that already appeared in an earlier text."""
+    seen = set()
+    duplicates = 0
+    for text in texts:
+        tokens = TOKEN_RE.findall(text.lower())
+        shingles = [tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        starts = np.flatnonzero([shingle in seen for shingle in shingles]) if shingles else []
+        # Mark the n tokens from each repeated start: +1 at the start, -1 n tokens later
+        marks = np.zeros(len(tokens) + 1, dtype="int32")
+        np.add.at(marks, starts, 1)
+        np.add.at(marks, np.asarray(starts, dtype="int64") + n, -1)
+        duplicates += int((np.cumsum(marks[:-1]) > 0).sum())
+        seen.update(shingles)
+    return duplicates
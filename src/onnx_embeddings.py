@@ -0,0 +1,134 @@
+"""
+ONNX Runtime embedding backend.
+Exports a sentence-transformers model (mean pooling, e.g. all-MiniLM-L6-v2)
+to ONNX once, quantizes its weights to int8 and serves embeddings through
+onnxruntime on CPU. Behaves like `HuggingFaceEmbeddings` for `RAGSystem`.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILENAME = "model_int8.onnx"
+CONFIG_FILENAME = "onnx_config.json"
+
+
+def export_quantized_model(model_name: str, output_dir: str) -> str:
+    """Export `model_name` to an int8-quantized ONNX model in `output_dir`."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer, models
+
+    logger.info(f"Exporting {model_name} to ONNX in {output_dir}...")
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    pooling = [module for module in st_model if isinstance(module, models.Pooling)]
+    if not pooling or pooling[0].get_config_dict().get("pooling_mode_mean_tokens") is not True:
+        raise ValueError(f"{model_name}: only mean-pooling sentence-transformers models can be exported")
+    normalize = any(isinstance(module, models.Normalize) for module in st_model)
+
+    os.makedirs(output_dir, exist_ok=True)
+    transformer.tokenizer.save_pretrained(output_dir)
+
+    dummy = transformer.tokenizer(["export"], return_tensors="pt")
+    # Positional order of BertModel.forward
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(output_dir, "model_fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer.auto_model.eval(),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+
+    model_path = os.path.join(output_dir, MODEL_FILENAME)
+    quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+    for path in (fp32_path, fp32_path + ".data"):
+        # Newer torch exporters store weights in a side file
+        if os.path.exists(path):
+            os.remove(path)
+
+    with open(os.path.join(output_dir, CONFIG_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "normalize": normalize,
+        }, f)
+    return model_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """int8 ONNX Runtime embeddings, a drop-in replacement for HuggingFaceEmbeddings."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", model_dir: Optional[str] = None,
+                 batch_size: int = 32, threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The ONNX embedding backend needs onnxruntime. Install it with `pip install onnxruntime`."
+            ) from e
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        if model_dir is None:
+            model_dir = os.path.join("data", "onnx_models", re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        if not os.path.exists(os.path.join(model_dir, MODEL_FILENAME)):
+            export_quantized_model(model_name, model_dir)
+
+        with open(os.path.join(model_dir, CONFIG_FILENAME), encoding="utf-8") as f:
+            config = json.load(f)
+        self.max_seq_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILENAME), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 matrix (mean pooling, optional L2 normalisation)."""
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            inputs = {name: value.astype("int64") for name, value in batch.items() if name in self._input_names}
+            hidden = self.session.run(None, inputs)[0]
+            mask = batch["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled.astype("float32"))
+        if not vectors:
+            return np.empty((0, 0), dtype="float32")
+        return np.concatenate(vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
@@ -1,21 +1,142 @@
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+import logging
 import os
+import random
+import threading
+import time
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from confidence import ScoreCalibrator
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine
+from onnx_embeddings import OnnxEmbeddings
+from reranker import CrossEncoderReranker
+from rwlock import ReadWriteLock
+import doc_file
+import index_versions
+import metadata_filter
+import mmr
+import sqlite_docstore
+import vector_index
+from doc_file import DocFile, DocIdMap
+from sqlite_docstore import SQLiteDocstore
+from vector_file import VectorFile
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.faiss"
+# Hybrid retrieval fuses the top k * HYBRID_FETCH_FACTOR of each of the dense and BM25 rankings
+HYBRID_FETCH_FACTOR = 4
+# Filters selecting at most this many chunks are searched by scanning their vectors
+FILTER_SCAN_MAX = 2_000
+# Vector ID sets of recently used metadata filters
+FILTER_CACHE_SIZE = 256
+# An HNSW index is rebuilt without its deleted vectors once they reach this fraction of it
+COMPACT_DELETED_FRACTION = 0.1
+
 class RAGSystem:
-    def __init__(self):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", embedding_cache_dir: Optional[str] = "data/embedding_cache",
+                 encode_batch_size: int = 64, encode_processes: int = 1, embedding_backend: Optional[str] = None,
+                 query_cache_size: int = 1024, index_type: Optional[str] = None,
+                 exact_rerank: bool = True, rerank_factor: int = 4, docstore_backend: Optional[str] = None,
+                 hybrid_search: bool = True, reranker_model: Optional[str] = None, rerank_fetch_k: int = 20,
+                 rerank_budget_ms: Optional[float] = None, mmr_lambda: Optional[float] = None,
+                 mmr_fetch_k: int = 20, mmr_stats_sample: Optional[float] = None,
+                 score_calibration_path: str = "data/score_calibration.json"):
         # Set environment variable to avoid tokenizer warnings
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.model_name = model_name
+        # "huggingface" (PyTorch) or "onnx" (int8 ONNX Runtime, CPU)
+        self.embedding_backend = (embedding_backend or os.getenv("EMBEDDING_BACKEND", "huggingface")).lower()
+        if self.embedding_backend == "onnx":
+            self.embeddings = OnnxEmbeddings(model_name=model_name)
+        elif self.embedding_backend == "huggingface":
+            self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
+        else:
+            raise ValueError(f"Unknown embedding backend: {self.embedding_backend}")
+        # Document encoder used for index builds (queries still go through self.embeddings)
+        self.encoder = EmbeddingEngine(self.embeddings, batch_size=encode_batch_size, processes=encode_processes)
+        # Chunk embeddings are reused across index builds; None disables the cache
+        self.embedding_cache_dir = embedding_cache_dir
+        self._embedding_cache = None
+        # LRU cache of query vectors keyed by normalized query text; 0 disables it
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
+        # "flat", "hnsw", "ivf" or "auto" (picked from the number of chunks)
+        self.index_type = (index_type or os.getenv("INDEX_TYPE", "auto")).lower()
+        if self.index_type not in vector_index.INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {self.index_type}")
+        # Compressed indexes (ivfpq, sq8) over-fetch k * rerank_factor candidates
+        # and re-score them with the exact vectors from the vector file
+        self.exact_rerank = exact_rerank
+        self.rerank_factor = rerank_factor
+        # Saved chunks live in "sqlite" (docs.sqlite) or "file" (docs.jsonl + offset index);
+        # saving to another directory, such as a new index version, writes a full copy of either
+        self.docstore_backend = (docstore_backend or os.getenv("DOCSTORE", "sqlite")).lower()
+        if self.docstore_backend not in ("sqlite", "file"):
+            raise ValueError(f"Unknown docstore backend: {self.docstore_backend}")
         self.vector_store = None
+        self.vector_file: Optional[VectorFile] = None
+        # Keyword index saved with the vectors; retrieve fuses both rankings when it exists
+        self.bm25: Optional[BM25Index] = None
+        self.hybrid_search = hybrid_search
+        # Optional cross-encoder stage: retrieve fetches rerank_fetch_k candidates and keeps the best k.
+        # Off unless a model is given (or RERANKER_MODEL is set); skipped when over the latency budget
+        reranker_model = reranker_model or os.getenv("RERANKER_MODEL")
+        budget = rerank_budget_ms if rerank_budget_ms is not None else os.getenv("RERANK_BUDGET_MS")
+        self.reranker = CrossEncoderReranker(
+            reranker_model, budget_ms=float(budget) if budget else None
+        ) if reranker_model else None
+        self.rerank_fetch_k = rerank_fetch_k
+        # Maximal marginal relevance: pick results among mmr_fetch_k candidates, trading relevance
+        # (weight mmr_lambda) against similarity to the results already picked; None (or 1) is off
+        lambda_env = os.getenv("MMR_LAMBDA")
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(lambda_env) if lambda_env else None
+        self.mmr_fetch_k = mmr_fetch_k
+        # Duplicated context tokens in the relevance-ordered results and in the MMR picks, counted
+        # on this fraction of MMR retrievals (0 = never) since it reads extra chunks
+        sample_env = os.getenv("MMR_STATS_SAMPLE")
+        self.mmr_stats_sample = mmr_stats_sample if mmr_stats_sample is not None \
+            else float(sample_env) if sample_env else 0.05
+        self._mmr_stats = {"queries": 0, "duplicate_tokens_before": 0, "duplicate_tokens_after": 0}
+        self._mmr_stats_lock = threading.Lock()
+        # Maps query-chunk cosine similarity to a calibrated score (see confidence.py)
+        self.score_calibrator = ScoreCalibrator.load(score_calibration_path)
+        # A memory-mapped index is read-only; it is copied into memory before it changes
+        self._index_mapped = False
+        # Queries share the index; adds, deletes, rebuilds, loads and saves take it exclusively
+        self._index_lock = ReadWriteLock()
+        # Metadata filter -> (sorted vector IDs, FAISS selector); cleared whenever the index changes
+        self._filter_cache: "OrderedDict[Tuple, Tuple[np.ndarray, faiss.IDSelector]]" = OrderedDict()
+        self._filter_cache_lock = threading.Lock()
+        # Vectors deleted from an HNSW index, which cannot remove them in place: searches skip
+        # them through an ID selector until compact() rebuilds the graph without them
+        self._deleted: set = set()
+        self._live_selector: Optional[Tuple[faiss.IDSelector, faiss.IDSelector]] = None
+        self._compact_lock = threading.Lock()
+        # One past the highest vector ID handed out since the index was loaded or created
+        self._id_high_water = 0
+        # Directory the chunks and vectors of a new index are written to (see start_build)
+        self._build_path: Optional[str] = None
+        # Directory and version (None if unversioned) of the loaded index
+        self.index_path: Optional[str] = None
+        self.index_version: Optional[str] = None
 
     def process_documents(self, documents: List[Document]) -> List[Document]:
         """Split documents into chunks."""
@@ -23,18 +144,342 @@ class RAGSystem:
 
     def create_index(self, documents: List[Document], path: str = "data/faiss_index"):
         """Create and save FAISS index from documents."""
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
-        self.vector_store.save_local(path)
+        self.index_documents(documents)
+        self.save_index(path)
+
+    def load_index(self, path: str = "data/faiss_index", mmap: bool = True):
+        """Load FAISS index from disk.
+
+        Vectors are memory-mapped and chunks read on demand from SQLite or
+        docs.jsonl, so loading does not grow with the corpus and processes
+        opening the same index share the page cache. Indexes pickled by
+        LangChain are still read.
+
+        For a versioned root (see index_versions) the CURRENT version is
+        loaded. The new index is opened next to the active one and swapped in
+        once in-flight queries finish, so this can run on a live system;
+        unsaved live changes to the old index are discarded.
+        """
+        index_path, version = index_versions.resolve(path)
+        if sqlite_docstore.exists(index_path) or doc_file.exists(index_path):
+            flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+            index = faiss.read_index(os.path.join(index_path, INDEX_FILENAME), flags)
+            docstore = self._open_docstore(index_path)
+            vector_store = FAISS(self.embeddings, index, docstore, DocIdMap(docstore))
+        else:
+            logger.warning(f"{index_path} uses the pickled LangChain format; save it again to convert it")
+            vector_store = FAISS.load_local(index_path, self.embeddings, allow_dangerous_deserialization=True)
+            # Its vectors are addressed by position; give them matching IDs so they can be
+            # added and deleted like any other index (index_to_docstore_id keys stay valid)
+            vector_store.index = vector_index.with_id_map(vector_store.index)
+            mmap = False
+        vector_file = VectorFile.load(index_path, vector_store.index.d)
+        bm25 = BM25Index.load(index_path)
+
+        with self._index_lock.write():
+            previous = self.vector_store
+            self.vector_store, self.vector_file, self._index_mapped = vector_store, vector_file, mmap
+            self.bm25 = bm25
+            self.index_path, self.index_version = index_path, version
+            self._set_deleted(set())
+            self._id_high_water = 0
+            self._clear_filter_cache()
+        # No query can still be using the previous index
+        if previous is not None and isinstance(previous.docstore, (DocFile, SQLiteDocstore)):
+            previous.docstore.close()
+        logger.info(f"Loaded index {version or index_path} ({vector_store.index.ntotal} vectors)")
+
+    @staticmethod
+    def _open_docstore(path: str):
+        """The chunk store saved in `path` (SQLite or docs.jsonl)."""
+        return SQLiteDocstore(path) if sqlite_docstore.exists(path) else DocFile(path)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # MiniLM is uncased and ignores whitespace runs, so this never changes the vector
+        return " ".join(query.lower().split())
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the vector of an identical (normalized) earlier query."""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries into a float32 matrix; cache misses are encoded in one batch."""
+        keys = [self.normalize_query(query) for query in queries]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._query_cache_lock:
+            for key in keys:
+                vector = self._query_cache.get(key)
+                if vector is not None:
+                    self._query_cache.move_to_end(key)
+                    vectors[key] = vector
+                    self.query_cache_hits += 1
+                else:
+                    self.query_cache_misses += 1
+
+        misses = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if misses:
+            encoded = np.asarray(self.embeddings.embed_documents(misses), dtype="float32")
+            vectors.update(zip(misses, encoded))
+            if self.query_cache_size > 0:
+                with self._query_cache_lock:
+                    for key, vector in zip(misses, encoded):
+                        self._query_cache[key] = vector
+                        self._query_cache.move_to_end(key)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+        return np.stack([vectors[key] for key in keys])
+
+    def query_cache_info(self) -> Dict[str, int]:
+        with self._query_cache_lock:
+            return {
+                "hits": self.query_cache_hits,
+                "misses": self.query_cache_misses,
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size,
+            }
+
+    def _clear_filter_cache(self):
+        with self._filter_cache_lock:
+            self._filter_cache.clear()
+
+    def _filter_ids(self, filters: Dict) -> Tuple[np.ndarray, faiss.IDSelector]:
+        """Sorted vector IDs of the chunks matching `filters`, and a FAISS selector over them."""
+        key = metadata_filter.cache_key(filters)
+        with self._filter_cache_lock:
+            if key in self._filter_cache:
+                self._filter_cache.move_to_end(key)
+                return self._filter_cache[key]
+        docstore = self.vector_store.docstore
+        if isinstance(docstore, SQLiteDocstore):
+            ids = docstore.ids_where(filters)
+        else:
+            ids = [vector_id for vector_id, doc in self._doc_records(raw=False)
+                   if metadata_filter.matches(doc.metadata, filters)]
+        ids = np.unique(np.asarray(ids, dtype="int64"))
+        # The selector keeps a pointer to the IDs; the cache entry keeps them alive
+        entry = (ids, faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+        with self._filter_cache_lock:
+            self._filter_cache[key] = entry
+            if len(self._filter_cache) > FILTER_CACHE_SIZE:
+                self._filter_cache.popitem(last=False)
+        return entry
+
+    def _search(self, vectors: np.ndarray, k: int, ef_search: Optional[int] = None,
+                nprobe: Optional[int] = None, exact_rerank: Optional[bool] = None,
+                filters: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the FAISS index directly; returns (distances, vector IDs).
+
+        With metadata `filters`, only matching chunks are searched: small
+        subsets by scanning their exact vectors, larger ones through a FAISS
+        ID selector (falling back to the scan when HNSW or IVF find too few).
+        """
+        queries = np.atleast_2d(vectors).astype("float32")
+        if not filters:
+            return self._index_search(queries, k, ef_search, nprobe, exact_rerank)
+        allowed, selector = self._filter_ids(filters)
+        scannable = self.vector_file is not None and self.vector_file.has(allowed)
+        if len(allowed) > FILTER_SCAN_MAX or not scannable:
+            distances, ids = self._index_search(queries, k, ef_search, nprobe, exact_rerank, selector)
+            if not scannable or (ids[:, :min(k, len(allowed))] >= 0).all():
+                return distances, ids
+        return vector_index.exact_search(queries, allowed, self.vector_file.get(allowed), k)
+
+    def _index_search(self, queries: np.ndarray, k: int, ef_search: Optional[int], nprobe: Optional[int],
+                      exact_rerank: Optional[bool], selector: Optional[faiss.IDSelector] = None):
+        """FAISS search of the whole index (or the selected IDs), re-ranking compressed indexes."""
+        index = self.vector_store.index
+        if selector is None and self._live_selector is not None:
+            # Filter selectors come from the docstore, so only unfiltered searches skip deleted vectors here
+            selector = self._live_selector[0]
+        params = vector_index.search_parameters(index, ef_search=ef_search, nprobe=nprobe, selector=selector)
+        rerank = self.exact_rerank if exact_rerank is None else exact_rerank
+        if not (rerank and self.vector_file and vector_index.index_type_of(index) in vector_index.COMPRESSED_TYPES):
+            return index.search(queries, k, params=params)
 
-    def load_index(self, path: str = "data/faiss_index"):
-        """Load FAISS index from disk."""
-        self.vector_store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        _, candidates = index.search(queries, k * self.rerank_factor, params=params)
+        candidate_vectors = self.vector_file.get(np.maximum(candidates, 0).ravel())
+        candidate_vectors = candidate_vectors.reshape(candidates.shape + (queries.shape[1],))
+        return vector_index.exact_rerank(queries, candidates, candidate_vectors, k)
 
-    def retrieve(self, query: str, k: int = 5) -> List[Document]:
-        """Retrieve relevant documents for a query."""
+    def _hits(self, ids) -> List[Tuple[int, Document]]:
+        """(vector ID, chunk) of the `ids` still in the docstore."""
+        hits = []
+        for vector_id in ids:
+            docstore_id = self.vector_store.index_to_docstore_id.get(int(vector_id))
+            if docstore_id is None:
+                continue
+            doc = self.vector_store.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                hits.append((int(vector_id), doc))
+        return hits
+
+    def retrieve(self, query: str, k: int = 5, ef_search: Optional[int] = None,
+                 nprobe: Optional[int] = None, exact_rerank: Optional[bool] = None,
+                 hybrid: Optional[bool] = None, filename=None, source=None,
+                 page_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                 language=None, rerank: Optional[bool] = None, mmr_lambda: Optional[float] = None,
+                 fetch_k: Optional[int] = None) -> List[Document]:
+        """Retrieve relevant documents for a query.
+
+        When the index has a BM25 keyword index, dense and keyword rankings
+        are fused with reciprocal rank fusion, so exact terms (names,
+        registration numbers) are found too; `hybrid=False` searches vectors
+        only. `ef_search` (HNSW) and `nprobe` (IVF) trade recall for speed per
+        call; by default the values stored in the index are used.
+        `exact_rerank` overrides the re-ranking of compressed indexes.
+
+        `filename`, `source` and `language` (a value or a list of values)
+        and `page_range` (inclusive (first, last), either end None for
+        open) restrict the search to matching chunks, e.g.
+        `retrieve(q, filename="reglement.pdf", page_range=(1, 10))`.
+
+        With a cross-encoder reranker configured, `rerank_fetch_k`
+        candidates are re-scored and the best k kept; `rerank=False` skips it.
+
+        `mmr_lambda` below 1 diversifies the results with maximal marginal
+        relevance over `fetch_k` candidates, so near-duplicate chunks (copies
+        of the same PDF) do not fill the context; both default to the values
+        given to the constructor.
+        """
+        return self.retrieve_many([query], k=k, ef_search=ef_search, nprobe=nprobe,
+                                  exact_rerank=exact_rerank, hybrid=hybrid, filename=filename,
+                                  source=source, page_range=page_range, language=language, rerank=rerank,
+                                  mmr_lambda=mmr_lambda, fetch_k=fetch_k)[0]
+
+    def retrieve_many(self, queries: List[str], k: int = 5, ef_search: Optional[int] = None,
+                      nprobe: Optional[int] = None, exact_rerank: Optional[bool] = None,
+                      hybrid: Optional[bool] = None, filename=None, source=None,
+                      page_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                      language=None, rerank: Optional[bool] = None, mmr_lambda: Optional[float] = None,
+                      fetch_k: Optional[int] = None) -> List[List[Document]]:
+        """Retrieve documents for several queries at once, like `retrieve` for each.
+
+        Queries are embedded in one batch and searched with a single FAISS
+        call, which is much cheaper than one `retrieve` per query. Their
+        candidates are re-ranked in one cross-encoder batch.
+        """
+        hits = self.retrieve_many_with_scores(
+            queries, k=k, ef_search=ef_search, nprobe=nprobe, exact_rerank=exact_rerank, hybrid=hybrid,
+            filename=filename, source=source, page_range=page_range, language=language, rerank=rerank,
+            mmr_lambda=mmr_lambda, fetch_k=fetch_k, calibrated=False,
+        )
+        return [[doc for doc, _ in row] for row in hits]
+
+    def retrieve_with_scores(self, query: str, k: int = 5, calibrated: bool = True,
+                             **kwargs) -> List[Tuple[Document, float]]:
+        """Like `retrieve`, with each document's score (see `retrieve_many_with_scores`)."""
+        return self.retrieve_many_with_scores([query], k=k, calibrated=calibrated, **kwargs)[0]
+
+    def retrieve_many_with_scores(self, queries: List[str], k: int = 5, ef_search: Optional[int] = None,
+                                  nprobe: Optional[int] = None, exact_rerank: Optional[bool] = None,
+                                  hybrid: Optional[bool] = None, filename=None, source=None,
+                                  page_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                                  language=None, rerank: Optional[bool] = None,
+                                  mmr_lambda: Optional[float] = None, fetch_k: Optional[int] = None,
+                                  calibrated: bool = True) -> List[List[Tuple[Document, float]]]:
+        """`retrieve_many` with a (document, score) pair per result, in result order.
+
+        The score is the cosine similarity of the query and chunk vectors,
+        which means the same whether results were fused, diversified or
+        re-ranked; `calibrated` maps it to a probability with the fitted
+        `score_calibrator`.
+        """
         if not self.vector_store:
             raise ValueError("Vector store not initialized. Please load or create an index first.")
-        return self.vector_store.similarity_search(query, k=k)
+        if not queries:
+            return []
+        filters = metadata_filter.build_filters(filename, source, page_range, language)
+        vectors = self.embed_queries(queries)
+        use_hybrid = self.hybrid_search if hybrid is None else hybrid
+        use_rerank = self.reranker is not None and rerank is not False
+        n_candidates = max(k, self.rerank_fetch_k) if use_rerank else k
+        lambda_mult = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        use_mmr = lambda_mult is not None and lambda_mult < 1
+        n_fetch = max(n_candidates, fetch_k or self.mmr_fetch_k) if use_mmr else n_candidates
+        with self._index_lock.read():
+            if not (use_hybrid and self.bm25 is not None):
+                _, ids = self._search(vectors, n_fetch, ef_search=ef_search, nprobe=nprobe,
+                                      exact_rerank=exact_rerank, filters=filters)
+                rankings = [[int(i) for i in row if i >= 0] for row in ids]
+            else:
+                hybrid_k = n_fetch * HYBRID_FETCH_FACTOR
+                _, dense_ids = self._search(vectors, hybrid_k, ef_search=ef_search, nprobe=nprobe,
+                                            exact_rerank=exact_rerank, filters=filters)
+                allowed = self._filter_ids(filters)[0] if filters else None
+                rankings = []
+                for query, row in zip(queries, dense_ids):
+                    keyword_ids, _ = self.bm25.search(query, hybrid_k, allowed=allowed)
+                    rankings.append(reciprocal_rank_fusion([row.tolist(), keyword_ids.tolist()], n_fetch))
+            if use_mmr:
+                picks = [self._diversify(vector, ranking, n_candidates, lambda_mult)
+                         for vector, ranking in zip(vectors, rankings)]
+            else:
+                picks = [ranking[:n_candidates] for ranking in rankings]
+            results = []
+            found_ids = []
+            for vector, ids in zip(vectors, picks):
+                found = self._hits(ids)
+                similarities = self._similarities(vector, [vector_id for vector_id, _ in found])
+                results.append([(doc, float(score)) for (_, doc), score in zip(found, similarities)])
+                found_ids.append([vector_id for vector_id, _ in found])
+            sampled = []
+            if use_mmr:
+                for ranking, row, ids in zip(rankings, results, found_ids):
+                    if random.random() < self.mmr_stats_sample:
+                        # Only the relevance-ordered chunks MMR did not pick still have to be read
+                        picked = {vector_id: doc for vector_id, (doc, _) in zip(ids, row)}
+                        missing = dict(self._hits([i for i in ranking[:n_candidates] if i not in picked]))
+                        relevance_order = [picked.get(i) or missing.get(i) for i in ranking[:n_candidates]]
+                        sampled.append(([doc for doc in relevance_order if doc is not None],
+                                        [doc for doc, _ in row]))
+        # Counted once the index is released, so writers and swaps do not wait on it
+        for relevance_order, picked in sampled:
+            self._record_mmr(relevance_order, picked)
+        if use_rerank:
+            # Candidates are plain documents by now, so the index is not held while the model runs
+            reranked = self.reranker.rerank_many(queries, [[doc for doc, _ in row] for row in results], k)
+            scores = [{id(doc): score for doc, score in row} for row in results]
+            results = [[(doc, row_scores[id(doc)]) for doc in row] for row, row_scores in zip(reranked, scores)]
+        if calibrated:
+            for i, row in enumerate(results):
+                probabilities = self.score_calibrator([score for _, score in row])
+                results[i] = [(doc, float(p)) for (doc, _), p in zip(row, probabilities)]
+        return results
+
+    def _vectors(self, ids: List[int]) -> np.ndarray:
+        """Stored vectors of `ids`, from the vector file or else the index."""
+        if self.vector_file is not None and self.vector_file.has(ids):
+            return self.vector_file.get(ids)
+        if not ids:
+            return np.empty((0, self.vector_store.index.d), dtype="float32")
+        return np.vstack([self.vector_store.index.reconstruct(int(i)) for i in ids])
+
+    def _similarities(self, query_vector: np.ndarray, ids: List[int]) -> np.ndarray:
+        vectors = self._vectors(ids)
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+        return vectors @ query_vector / np.maximum(norms, 1e-12)
+
+    def _diversify(self, query_vector: np.ndarray, ranking: List[int], k: int, lambda_mult: float) -> List[int]:
+        """MMR pick of k of the ranked candidate IDs."""
+        picked = mmr.maximal_marginal_relevance(query_vector, self._vectors(ranking), k, lambda_mult)
+        return [ranking[i] for i in picked]
+
+    def _record_mmr(self, relevance_order: List[Document], picked: List[Document]):
+        """Count the duplicated tokens MMR kept out of the results."""
+        before = mmr.duplicate_tokens([doc.page_content for doc in relevance_order])
+        after = mmr.duplicate_tokens([doc.page_content for doc in picked])
+        with self._mmr_stats_lock:
+            self._mmr_stats["queries"] += 1
+            self._mmr_stats["duplicate_tokens_before"] += before
+            self._mmr_stats["duplicate_tokens_after"] += after
+
+    def mmr_stats(self) -> Dict[str, int]:
+        """Duplicated context tokens of the sampled MMR retrievals, without (before) and with (after) MMR."""
+        with self._mmr_stats_lock:
+            stats = dict(self._mmr_stats)
+        stats["duplicate_tokens_removed"] = stats["duplicate_tokens_before"] - stats["duplicate_tokens_after"]
+        return stats
 
     def create_documents(self, data: List[Dict[str, str]]) -> List[Document]:
         documents = []
@@ -49,9 +494,342 @@ class RAGSystem:
                 )
         return documents
 
-    def index_documents(self, documents: List[Document]):
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
+    def start_build(self, path: str):
+        """Start a new index whose chunks and vectors are written to `path` as they are added.
+
+        The next adds go to docs.sqlite and vectors.f32 in `path` instead of
+        being held in memory until save_index; saving to `path` then only
+        commits them. Used by streaming builds so memory stays flat.
+        """
+        with self._index_lock.write():
+            self.vector_store = None
+            self._build_path = path
+
+    def _new_vector_store(self, dim: int) -> FAISS:
+        # Vectors carry stable int64 IDs so they can be deleted without renumbering
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        path, self._build_path = self._build_path, None
+        self._set_deleted(set())
+        self._id_high_water = 0
+        if path is None:
+            self.vector_file = VectorFile(dim)
+            return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+        os.makedirs(path, exist_ok=True)
+        if sqlite_docstore.exists(path):
+            os.remove(os.path.join(path, sqlite_docstore.FILENAME))
+        self.vector_file = VectorFile.create(path, dim)
+        docstore = SQLiteDocstore(path)
+        return FAISS(self.embeddings, index, docstore, DocIdMap(docstore))
+
+    def _next_id(self) -> int:
+        """One past every vector ID the index has held, so IDs of deleted chunks are never reused.
+
+        Manifests and processes that mapped vectors.f32 may still refer to a
+        deleted ID; handing it out again would point them at another chunk.
+        """
+        ids = vector_index.stored_ids(self.vector_store.index)
+        next_id = max(self._id_high_water, int(ids.max()) + 1 if len(ids) else 0)
+        if self.vector_file is not None:
+            next_id = max(next_id, self.vector_file.end())
+        docstore = self.vector_store.docstore
+        if isinstance(docstore, (DocFile, SQLiteDocstore)):
+            next_id = max(next_id, docstore.max_id() + 1)
+        return next_id
+
+    def _writable_index(self) -> faiss.Index:
+        """The index, copied into memory first if it is memory-mapped."""
+        if self._index_mapped:
+            index = self.vector_store.index
+            self.vector_store.index = faiss.deserialize_index(faiss.serialize_index(index))
+            self._index_mapped = False
+        return self.vector_store.index
+
+    def index_documents(self, documents: List[Document]) -> List[int]:
+        """Build a new index from documents and return their vector IDs."""
+        self.vector_store = None
+        ids = self.add_documents(documents)
+        self.finalize_index()
+        return ids
+
+    def finalize_index(self, index_type: Optional[str] = None) -> str:
+        """Rebuild the index as the configured type once all vectors are in.
+
+        Builds add into a flat index; HNSW/IVF/compressed indexes are built
+        from the exact vectors here, with "auto" choosing from the number of
+        vectors. Returns the final type.
+        """
+        self.compact(wait=True)
+        with self._index_lock.write():
+            return self._finalize_index(index_type)
+
+    def _finalize_index(self, index_type: Optional[str]) -> str:
+        if not self.vector_store:
+            return ""
+        self._drop_deleted()
+        index = self.vector_store.index
+        target = (index_type or self.index_type).lower()
+        if target == "auto":
+            target = vector_index.choose_index_type(index.ntotal)
+        current = vector_index.index_type_of(index)
+        if self.vector_file is None and current not in vector_index.COMPRESSED_TYPES:
+            # Indexes saved before the vector file existed: back it up from the exact vectors
+            self.vector_file = VectorFile(index.d)
+            self.vector_file.put(*vector_index.reconstruct_all(index))
+        if target != current:
+            logger.info(f"Rebuilding {current} index of {index.ntotal} vectors as {target}...")
+            ids, vectors = self._exact_vectors()
+            self.vector_store.index = vector_index.build_index(vectors, ids, target)
+            self._index_mapped = False
+        return target
+
+    def _exact_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, vectors) of the index, unquantized when the vector file has them."""
+        index = self.vector_store.index
+        if self.vector_file is None or vector_index.index_type_of(index) not in vector_index.COMPRESSED_TYPES:
+            return vector_index.reconstruct_all(index)
+        ids = vector_index.stored_ids(index)
+        if not self.vector_file.has(ids):
+            return vector_index.reconstruct_all(index)
+        return ids, self.vector_file.get(ids)
+
+    def index_report(self, k: int = 5, n_queries: int = 200) -> str:
+        """Recall@k, latency and bytes per vector of the index against an exact scan."""
+        if not self.vector_store:
+            raise ValueError("Vector store not initialized. Please load or create an index first.")
+        with self._index_lock.read():
+            index = self.vector_store.index
+            compressed = vector_index.index_type_of(index) in vector_index.COMPRESSED_TYPES
+            rows = vector_index.recall_report(
+                index, k=k, n_queries=n_queries, exact=self._exact_vectors(),
+                rerank_factor=self.rerank_factor if compressed and self.vector_file else 0,
+            )
+        return vector_index.format_report(rows, k)
+
+    @property
+    def embedding_id(self) -> str:
+        """Identifies the vectors this system produces (model plus backend)."""
+        if self.embedding_backend == "onnx":
+            return f"{self.model_name}-onnx-int8"
+        return self.model_name
+
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        # Opened lazily: only index builds need it, not the chat app
+        if self._embedding_cache is None and self.embedding_cache_dir:
+            self._embedding_cache = EmbeddingCache(self.embedding_cache_dir, self.embedding_id)
+        return self._embedding_cache
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed chunk texts into a float32 matrix, reusing cached vectors."""
+        cache = self.embedding_cache
+        if cache is None or not texts:
+            return self.encoder.encode(texts)
+
+        keys = [cache.key(text) for text in texts]
+        hit_positions, hit_vectors = cache.get(keys)
+        hit_set = set(hit_positions)
+        miss_positions = [i for i in range(len(texts)) if i not in hit_set]
+        if not miss_positions:
+            vectors = hit_vectors
+        else:
+            miss_vectors = self.encoder.encode([texts[i] for i in miss_positions])
+            cache.put([keys[i] for i in miss_positions], miss_vectors)
+            vectors = np.empty((len(texts), miss_vectors.shape[1]), dtype="float32")
+            vectors[miss_positions] = miss_vectors
+            if hit_positions:
+                vectors[hit_positions] = hit_vectors
+        logger.info(f"Embedded {len(texts)} chunks, {len(hit_positions)} from cache "
+                    f"(cache hit rate so far: {cache.hit_rate:.1%})")
+        return vectors
+
+    def add_documents(self, documents: List[Document]) -> List[int]:
+        """Embed documents, add them to the index and return their vector IDs.
+
+        Safe while queries run: chunks are embedded first, then added under
+        the index lock, so searches see all of them or none.
+        """
+        if not documents:
+            return []
+        return self.add_embeddings(documents, self.embed_documents([doc.page_content for doc in documents]))
+
+    def add_embeddings(self, documents: List[Document], vectors: np.ndarray) -> List[int]:
+        """Add already-embedded documents to the index and return their vector IDs."""
+        if not documents:
+            return []
+        with self._index_lock.write():
+            if self.vector_store is None:
+                self.vector_store = self._new_vector_store(vectors.shape[1])
+            start = self._next_id()
+            ids = list(range(start, start + len(documents)))
+            self._id_high_water = start + len(documents)
+            self._writable_index().add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+            if self.vector_file is None:
+                self.vector_file = VectorFile(vectors.shape[1])
+            self.vector_file.put(ids, vectors)
+            self.vector_store.docstore.add({str(i): doc for i, doc in zip(ids, documents)})
+            self.vector_store.index_to_docstore_id.update({i: str(i) for i in ids})
+            if self.bm25 is not None:
+                self.bm25.add(ids, [doc.page_content for doc in documents])
+            self._clear_filter_cache()
+        return ids
+
+    def delete_documents(self, ids: List[int]) -> int:
+        """Remove vectors (and their chunks) by vector ID. Returns how many were removed.
+
+        HNSW graphs cannot delete in place: their vectors are masked out of
+        searches instead, and the graph is rebuilt in the background (see
+        compact) once enough of it is deleted.
+        """
+        if not self.vector_store or not ids:
+            return 0
+        with self._index_lock.write():
+            known = [i for i in ids if i in self.vector_store.index_to_docstore_id]
+            if not known:
+                return 0
+            index = self.vector_store.index
+            if vector_index.removes_in_place(index):
+                self.vector_store.index, removed = vector_index.remove_ids(self._writable_index(), known)
+            else:
+                self._set_deleted(self._deleted | set(known))
+                removed = len(known)
+            self.vector_store.docstore.delete([self.vector_store.index_to_docstore_id.pop(i) for i in known])
+            if self.bm25 is not None:
+                self.bm25.delete(known)
+            self._clear_filter_cache()
+            should_compact = len(self._deleted) >= COMPACT_DELETED_FRACTION * index.ntotal
+        if should_compact:
+            threading.Thread(target=self.compact, name="index-compaction", daemon=True).start()
+        return removed
+
+    def _set_deleted(self, deleted: set):
+        self._deleted = deleted
+        self._live_selector = vector_index.excluding(deleted) if deleted else None
+
+    def compact(self, wait: bool = False) -> int:
+        """Rebuild an HNSW index without its deleted vectors. Returns how many were dropped.
+
+        The graph is rebuilt from a snapshot without holding the index lock,
+        so queries, adds and deletes carry on; it is swapped in afterwards,
+        with vectors added meanwhile copied over. Without `wait`, returns 0 if
+        a compaction is already running.
+        """
+        if not self._compact_lock.acquire(blocking=wait):
+            return 0
+        try:
+            with self._index_lock.write():
+                # Copied now rather than by the next add, which would swap the snapshot's index out
+                if self.vector_store and self._deleted:
+                    self._writable_index()
+            with self._index_lock.read():
+                if not self.vector_store or not self._deleted:
+                    return 0
+                index = self.vector_store.index
+                deleted = np.fromiter(self._deleted, dtype="int64")
+                ids, vectors = vector_index.reconstruct_all(index)
+            keep = ~np.isin(ids, deleted)
+            start = time.perf_counter()
+            rebuilt = vector_index.build_like(index, vectors[keep], ids[keep])
+            with self._index_lock.write():
+                if self.vector_store is None or self.vector_store.index is not index:
+                    # Reloaded or rebuilt meanwhile; the next delete compacts again if needed
+                    return 0
+                added = np.setdiff1d(vector_index.stored_ids(index), ids)
+                if len(added):
+                    rebuilt.add_with_ids(np.vstack([index.reconstruct(int(i)) for i in added]), added)
+                self.vector_store.index = rebuilt
+                self._index_mapped = False
+                self._set_deleted(self._deleted - set(deleted.tolist()))
+                self._clear_filter_cache()
+            logger.info(f"Compacted the HNSW index: dropped {len(deleted)} deleted vectors "
+                        f"in {time.perf_counter() - start:.1f}s")
+            return len(deleted)
+        finally:
+            self._compact_lock.release()
+
+    def _drop_deleted(self):
+        """Rebuild the HNSW index without its deleted vectors, under the held write lock."""
+        if self._deleted:
+            index = self.vector_store.index
+            self.vector_store.index, _ = vector_index.remove_ids(index, np.fromiter(self._deleted, dtype="int64"))
+            self._index_mapped = False
+            self._set_deleted(set())
+
+    def delete_by_source(self, source: str) -> int:
+        """Remove every chunk whose metadata "source" is `source` (e.g. "data/notice.pdf").
+
+        Safe while queries run. Returns how many chunks were removed.
+        """
+        if not self.vector_store:
+            return 0
+        with self._index_lock.read():
+            docstore = self.vector_store.docstore
+            if isinstance(docstore, SQLiteDocstore):
+                ids = docstore.ids_for_source(source)
+            else:
+                ids = [vector_id for vector_id, doc in self._doc_records(raw=False)
+                       if doc.metadata.get("source") == source]
+        removed = self.delete_documents(ids)
+        logger.info(f"Removed {removed} chunks of {source}")
+        return removed
+
+    def close(self):
+        """Release background resources such as the encode process pool."""
+        self.encoder.close()
+
+    def _doc_records(self, raw: bool):
+        """(vector ID, chunk) pairs of the docstore; `raw` allows DocFile's encoded bytes."""
+        docstore = self.vector_store.docstore
+        if isinstance(docstore, DocFile):
+            return docstore.records(raw=raw)
+        if isinstance(docstore, SQLiteDocstore):
+            return docstore.records()
+        return ((vector_id, docstore.search(docstore_id))
+                for vector_id, docstore_id in self.vector_store.index_to_docstore_id.items())
 
     def save_index(self, path: str = "faiss_index"):
-        if self.vector_store:
-            self.vector_store.save_local(path) 
\ No newline at end of file
+        """Save the index as index.faiss, vectors.f32, the chunk store and bm25/ (no pickle)."""
+        if not self.vector_store:
+            return
+        # Deleted HNSW vectors are not saved; rebuild without them while queries still run
+        self.compact(wait=True)
+        with self._index_lock.write():
+            self._save_index(path)
+
+    def _save_index(self, path: str):
+        self._drop_deleted()
+        os.makedirs(path, exist_ok=True)
+        index_file = os.path.join(path, INDEX_FILENAME)
+        # Written aside and renamed, so processes that mapped the old files are unaffected
+        faiss.write_index(self.vector_store.index, index_file + ".tmp")
+        os.replace(index_file + ".tmp", index_file)
+        if self.vector_file is not None:
+            self.vector_file.save(path)
+
+        docstore = self.vector_store.docstore
+        # An SQLite store saved to its own directory only needs its transaction committed
+        in_place = (self.docstore_backend == "sqlite" and isinstance(docstore, SQLiteDocstore)
+                    and os.path.abspath(docstore.path) == os.path.abspath(path))
+        if in_place:
+            docstore.commit()
+        elif self.docstore_backend == "sqlite":
+            sqlite_docstore.write_docstore(path, self._doc_records(raw=False))
+        else:
+            doc_file.write_docs(path, self._doc_records(raw=True))
+        # Files of the other formats would shadow the new chunk store on load
+        stale = [doc_file.DATA_FILENAME, doc_file.INDEX_FILENAME] if self.docstore_backend == "sqlite" \
+            else [sqlite_docstore.FILENAME]
+        for filename in stale + ["index.pkl"]:
+            if os.path.exists(os.path.join(path, filename)):
+                os.remove(os.path.join(path, filename))
+
+        # Serve chunks from the saved files from now on instead of keeping them in memory
+        if not in_place:
+            if isinstance(docstore, (DocFile, SQLiteDocstore)):
+                docstore.close()
+            docstore = self._open_docstore(path)
+            self.vector_store.docstore = docstore
+            self.vector_store.index_to_docstore_id = DocIdMap(docstore)
+
+        # The keyword index is rebuilt from the saved chunks, folding in live changes
+        self.bm25 = BM25Index.build((vector_id, doc.page_content) for vector_id, doc in self._doc_records(raw=False))
+        self.bm25.save(path)
@@ -0,0 +1,129 @@
+"""
+Cross-encoder re-ranking of retrieved chunks.
+The first-stage search over-fetches candidates; a small cross-encoder reads
+each (query, chunk) pair and keeps the best few, so fewer and better chunks
+reach the LLM prompt. Pair scores are cached, and the stage skips itself when
+its estimated cost exceeds a latency budget (e.g. when many queries are
+being re-ranked at once).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Each skipped call lowers the per-pair estimate by this factor, so a spike (or a slow
+# first call) is eventually re-measured by a real call instead of skipping for good
+SKIP_DECAY = 0.8
+
+
+class CrossEncoderReranker:
+    """Re-ranks documents with a sentence-transformers CrossEncoder, loaded on first use."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, budget_ms: Optional[float] = None,
+                 cache_size: int = 10_000, batch_size: int = 64):
+        self.model_name = model_name
+        # Skip re-ranking when scoring the uncached pairs is expected to take longer; None never skips
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._model = None
+        # (query, chunk text) -> score, least recently used first
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Moving average of the seconds spent per scored pair, for the budget estimate
+        self._seconds_per_pair: Optional[float] = None
+        self._in_flight = 0
+        self.calls = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            start = time.perf_counter()
+            self._model = CrossEncoder(self.model_name)
+            logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def _over_budget(self, n_pairs: int) -> bool:
+        if self.budget_ms is None or self._seconds_per_pair is None or not n_pairs:
+            return False
+        # Concurrent re-ranks share the CPU, so each one waits for the others' pairs too
+        estimate = self._seconds_per_pair * n_pairs * (self._in_flight + 1)
+        return estimate * 1000 > self.budget_ms
+
+    def rerank_many(self, queries: Sequence[str], candidates: Sequence[List[Document]],
+                    top_n: int) -> List[List[Document]]:
+        """The `top_n` best of each query's candidates, best first.
+
+        Every uncached pair of every query is scored in one batched forward
+        pass. Over budget, candidates keep their first-stage order.
+        """
+        keys = [[(query, doc.page_content) for doc in docs] for query, docs in zip(queries, candidates)]
+        with self._lock:
+            self.calls += 1
+            scores = {}
+            for key in (key for row in keys for key in row):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            missing = list(dict.fromkeys(key for row in keys for key in row if key not in scores))
+            if self._over_budget(len(missing)):
+                self.skipped += 1
+                self._seconds_per_pair *= SKIP_DECAY
+                return [list(docs[:top_n]) for docs in candidates]
+            self.cache_hits += sum(len(row) for row in keys) - len(missing)
+            self.cache_misses += len(missing)
+            self._in_flight += 1
+
+        try:
+            if missing:
+                # Loaded before timing, so the load does not count as scoring time
+                model = self.model
+                start = time.perf_counter()
+                predicted = model.predict(missing, batch_size=self.batch_size, show_progress_bar=False)
+                elapsed = (time.perf_counter() - start) / len(missing)
+        except Exception:
+            logger.exception("Re-ranking failed; keeping the first-stage order")
+            return [list(docs[:top_n]) for docs in candidates]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        with self._lock:
+            if missing:
+                self._seconds_per_pair = (elapsed if self._seconds_per_pair is None
+                                          else 0.8 * self._seconds_per_pair + 0.2 * elapsed)
+                for key, score in zip(missing, predicted):
+                    self._cache[key] = float(score)
+                    scores[key] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        results = []
+        for docs, row in zip(candidates, keys):
+            order = sorted(range(len(docs)), key=lambda i: scores[row[i]], reverse=True)
+            results.append([docs[i] for i in order[:top_n]])
+        return results
+
+    def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        return self.rerank_many([query], [documents], top_n)[0]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "skipped": self.skipped,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "ms_per_pair": (self._seconds_per_pair or 0.0) * 1000,
+            }
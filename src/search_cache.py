@@ -0,0 +1,112 @@
+"""
+Persistent cache of web search responses.
+Responses are stored in SQLite, keyed by the normalized query and the number
+of results, and expire after a TTL (shorter for searches that found
+nothing). The least recently used entries are evicted beyond a size bound.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    query TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (query, max_results)
+);
+CREATE INDEX IF NOT EXISTS searches_accessed ON searches (accessed);
+"""
+
+
+class SearchCache:
+    """TTL + LRU cache of search responses (JSON-serializable dicts) in an SQLite file."""
+
+    def __init__(self, path: str = "data/search_cache.sqlite", ttl: float = 6 * 3600,
+                 negative_ttl: float = 15 * 60, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        # Empty responses are cached too, but retried sooner
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        # Case, accents' Unicode form and whitespace runs do not change the search
+        return " ".join(unicodedata.normalize("NFC", query).lower().split())
+
+    def get(self, query: str, max_results: int) -> Optional[Dict[str, Any]]:
+        """The cached response, or None on a miss."""
+        key = (self.normalize(query), max_results)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires FROM searches WHERE query = ? AND max_results = ?", key
+            ).fetchone()
+            if row is not None and row[1] > now:
+                self._conn.execute("UPDATE searches SET accessed = ? WHERE query = ? AND max_results = ?",
+                                   (now,) + key)
+                self._conn.commit()
+                response = json.loads(row[0])
+                self.hits += 1
+                self.negative_hits += not response.get("results")
+            else:
+                if row is not None:
+                    self._conn.execute("DELETE FROM searches WHERE query = ? AND max_results = ?", key)
+                    self._conn.commit()
+                response = None
+                self.misses += 1
+        logger.info(f"Search cache {'hit' if response is not None else 'miss'} for {key[0]!r}: {self.stats()}")
+        return response
+
+    def put(self, query: str, max_results: int, response: Dict[str, Any]):
+        now = time.time()
+        ttl = self.ttl if response.get("results") else self.negative_ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                (self.normalize(query), max_results, json.dumps(response, ensure_ascii=False), now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM searches WHERE expires <= ?", (now,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM searches WHERE rowid IN "
+                    "(SELECT rowid FROM searches ORDER BY accessed LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
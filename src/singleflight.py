@@ -0,0 +1,48 @@
+"""
+Single-flight coalescing of identical in-flight async calls.
+Callers asking for a key that is already being computed wait for that
+computation instead of starting their own, so N concurrent duplicates cost
+one upstream call.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class SingleFlight:
+    """Shares the result (or exception) of one in-flight call per key among all its callers."""
+
+    def __init__(self):
+        # key -> [task, number of callers waiting on it]
+        self._in_flight: Dict[Hashable, List[Any]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._in_flight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, entry))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        entry[1] += 1
+        try:
+            # A caller that is cancelled does not cancel the call for the others
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not entry[0].done():
+                # Forgotten first, so a caller arriving before the task winds down starts a fresh call
+                self._forget(key, entry)
+                entry[0].cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key: Hashable, entry: List[Any]):
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
@@ -0,0 +1,164 @@
+"""
+SQLite-backed chunk storage next to the FAISS index.
+One row per chunk, keyed by vector ID, in `docs.sqlite`. Retrieval reads
+only the rows of the hits, so resident memory does not depend on the size of
+the corpus. Chunks are added and deleted in place; saving the index to
+another directory (each published version is one) writes a new copy.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+FILENAME = "docs.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id INTEGER PRIMARY KEY,
+    source TEXT,
+    filename TEXT,
+    page INTEGER,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    language TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+CREATE INDEX IF NOT EXISTS chunks_filename ON chunks (filename);
+"""
+COLUMNS = "vector_id, source, filename, page, page_content, metadata, language"
+
+
+def exists(index_path: str) -> bool:
+    return os.path.exists(os.path.join(index_path, FILENAME))
+
+
+def _row(vector_id: int, document: Document) -> Tuple:
+    metadata = document.metadata
+    return (
+        vector_id, metadata.get("source"), metadata.get("filename"), metadata.get("page"),
+        document.page_content, json.dumps(metadata, ensure_ascii=False), metadata.get("language"),
+    )
+
+
+def write_docstore(index_path: str, records: Iterator[Tuple[int, Document]]):
+    """Write (vector ID, document) pairs to a new docs.sqlite, replacing it atomically."""
+    path = os.path.join(index_path, FILENAME)
+    if os.path.exists(path + ".tmp"):
+        os.remove(path + ".tmp")
+    conn = sqlite3.connect(path + ".tmp")
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(f"INSERT OR REPLACE INTO chunks ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (_row(vector_id, document) for vector_id, document in records))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(path + ".tmp", path)
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """LangChain docstore over docs.sqlite; docstore IDs are `str(vector_id)`.
+
+    Adds and deletes stay in an open transaction until `commit`, so other
+    processes reading the same file keep seeing the saved index.
+    """
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        self._conn = sqlite3.connect(os.path.join(index_path, FILENAME), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "language" not in columns:
+            # Stores written before chunks had a language
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN language TEXT")
+            self._conn.execute("UPDATE chunks SET language = json_extract(metadata, '$.language')")
+            self._conn.commit()
+        self._lock = threading.Lock()
+
+    def contains(self, vector_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM chunks WHERE vector_id = ?", (int(vector_id),)).fetchone()
+        return row is not None
+
+    def vector_ids(self) -> Iterator[int]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT vector_id FROM chunks ORDER BY vector_id")]
+        return iter(ids)
+
+    def ids_for_source(self, source: str) -> List[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT vector_id FROM chunks WHERE source = ?", (source,)).fetchall()
+        return [row[0] for row in rows]
+
+    def ids_where(self, filters: Dict) -> List[int]:
+        """Vector IDs of the chunks matching metadata filters (see metadata_filter)."""
+        clauses, params = [], []
+        for field in ("filename", "source", "language"):
+            if field in filters:
+                clauses.append(f"{field} IN ({', '.join('?' * len(filters[field]))})")
+                params.extend(filters[field])
+        first, last = filters.get("page_range", (None, None))
+        if first is not None:
+            clauses.append("page >= ?")
+            params.append(first)
+        if last is not None:
+            clauses.append("page <= ?")
+            params.append(last)
+        where = " AND ".join(clauses) or "1"
+        with self._lock:
+            rows = self._conn.execute(f"SELECT vector_id FROM chunks WHERE {where}", params).fetchall()
+        return [row[0] for row in rows]
+
+    def max_id(self) -> int:
+        """The highest vector ID stored; -1 if none."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(vector_id) FROM chunks").fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_content, metadata FROM chunks WHERE vector_id = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO chunks ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [_row(int(docstore_id), document) for docstore_id, document in texts.items()])
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE vector_id = ?", [(int(i),) for i in ids])
+
+    def records(self) -> Iterator[Tuple[int, Document]]:
+        """Every chunk, including changes not committed yet."""
+        with self._lock:
+            cursor = self._conn.execute("SELECT vector_id, page_content, metadata FROM chunks ORDER BY vector_id")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for vector_id, page_content, metadata in rows:
+                yield vector_id, Document(page_content=page_content, metadata=json.loads(metadata))
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        """Close the connection, discarding uncommitted changes."""
+        with self._lock:
+            self._conn.close()
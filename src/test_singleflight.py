@@ -0,0 +1,49 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_caller_after_last_waiter_cancelled_gets_fresh_call():
+    async def run():
+        flight = SingleFlight()
+        started = []
+
+        async def call():
+            started.append(len(started))
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                # Winds down over a few loop turns, like a cancelled HTTP request
+                await asyncio.sleep(0.01)
+                raise
+            return len(started)
+
+        first = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        # Arrives while the cancelled call is still winding down
+        second = await flight.do("key", call)
+        assert first.cancelled()
+        assert second == 2
+        assert flight.calls == 2 and flight.coalesced == 0
+
+    asyncio.run(run())
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+        assert results == ["result"] * 5
+        assert len(calls) == 1 and flight.coalesced == 4
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(run())
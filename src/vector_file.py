@@ -0,0 +1,105 @@
+"""
+Exact float32 vectors stored next to the FAISS index.
+Row i of `vectors.f32` holds the vector with ID i, so any vector can be read
+through mmap without keeping the matrix in memory. Compressed indexes use it
+for exact re-ranking and for rebuilding without quantization loss.
+"""
+
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class VectorFile:
+    """float32 vectors addressed by vector ID, memory-mapped from disk."""
+
+    FILENAME = "vectors.f32"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.path: Optional[str] = None
+        self._mmap = None
+        # Vectors added since the last save, by ID
+        self._pending: Dict[int, np.ndarray] = {}
+        # Written straight to `path` on put (a file no other process maps yet)
+        self.write_through = False
+
+    @classmethod
+    def load(cls, index_path: str, dim: int) -> Optional["VectorFile"]:
+        path = os.path.join(index_path, cls.FILENAME)
+        if not os.path.exists(path):
+            return None
+        vector_file = cls(dim)
+        vector_file.path = path
+        return vector_file
+
+    @classmethod
+    def create(cls, index_path: str, dim: int) -> "VectorFile":
+        """An empty vectors.f32 in `index_path` that vectors are written to as they are put."""
+        vector_file = cls(dim)
+        vector_file.path = os.path.join(index_path, cls.FILENAME)
+        open(vector_file.path, "wb").close()
+        vector_file.write_through = True
+        return vector_file
+
+    def _rows(self) -> np.ndarray:
+        if self._mmap is None:
+            if self.path is None or os.path.getsize(self.path) == 0:
+                return np.empty((0, self.dim), dtype="float32")
+            self._mmap = np.memmap(self.path, dtype="float32", mode="r").reshape(-1, self.dim)
+        return self._mmap
+
+    def put(self, ids: List[int], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype="float32")
+        if self.write_through:
+            self._write(self.path, zip(ids, vectors))
+            self._mmap = None
+            return
+        for vector_id, vector in zip(ids, vectors):
+            self._pending[int(vector_id)] = vector.copy()
+
+    def _write(self, path: str, rows):
+        row_bytes = self.dim * 4
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            for vector_id, vector in rows:
+                f.seek(int(vector_id) * row_bytes)
+                f.write(vector.tobytes())
+
+    def end(self) -> int:
+        """One past the highest vector ID stored, saved or not."""
+        return max(len(self._rows()), max(self._pending, default=-1) + 1)
+
+    def has(self, ids) -> bool:
+        ids = np.asarray(ids, dtype="int64")
+        on_disk = (ids >= 0) & (ids < len(self._rows()))
+        return bool(on_disk.all()) or all(int(i) in self._pending for i in ids[~on_disk])
+
+    def get(self, ids) -> np.ndarray:
+        """Vectors for `ids`, in order."""
+        ids = np.asarray(ids, dtype="int64")
+        if not self._pending:
+            return np.asarray(self._rows()[ids], dtype="float32")
+        out = np.empty((len(ids), self.dim), dtype="float32")
+        from_disk = []
+        for position, vector_id in enumerate(ids.tolist()):
+            pending = self._pending.get(vector_id)
+            if pending is not None:
+                out[position] = pending
+            else:
+                from_disk.append(position)
+        if from_disk:
+            out[from_disk] = self._rows()[ids[from_disk]]
+        return out
+
+    def save(self, index_path: str):
+        path = os.path.join(index_path, self.FILENAME)
+        if self.path and os.path.abspath(self.path) != os.path.abspath(path):
+            shutil.copyfile(self.path, path)
+        self._write(path, ((vector_id, self._pending[vector_id]) for vector_id in sorted(self._pending)))
+        self.path = path
+        self._pending.clear()
+        self._mmap = None
+        # A saved file may be mapped by other processes; later changes wait for the next save
+        self.write_through = False
@@ -0,0 +1,311 @@
+"""
+FAISS index construction and tuning helpers.
+Builds flat, HNSW, IVF-Flat and compressed (IVF-PQ, SQ8) indexes whose
+vectors keep stable int64 IDs (flat, HNSW and SQ8 through IndexIDMap2, IVF
+natively, since IndexIDMap cannot remove from IVF lists correctly), picks a
+type from the corpus size, maps per-query knobs (efSearch, nprobe) to FAISS
+search parameters and measures recall and size against an exact search.
+"""
+
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf", "ivfpq", "sq8")
+# Types whose stored vectors are lossy; exact vectors come from the vector file
+COMPRESSED_TYPES = ("ivfpq", "sq8")
+
+# Below this many vectors a brute-force scan is fast enough and exact
+FLAT_MAX_VECTORS = 20_000
+# Above this many vectors HNSW graphs get memory-hungry; IVF scales further
+HNSW_MAX_VECTORS = 1_000_000
+
+
+def choose_index_type(n_vectors: int) -> str:
+    if n_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf"
+
+
+def default_nlist(n_vectors: int) -> int:
+    # ~4*sqrt(n) lists, while keeping at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    """Number of PQ sub-quantizers: about 8 dimensions each, dividing `dim`."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The index underneath an IndexIDMap, downcast to its concrete type."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return faiss.downcast_index(index)
+
+
+def with_id_map(index: faiss.Index) -> faiss.Index:
+    """`index` with stable vector IDs: an index without an ID map (as LangChain pickles them)
+    is copied into a flat IndexIDMap2 where each vector's ID is its position."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return index
+    mapped = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+    if index.ntotal:
+        mapped.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype="int64"))
+    return mapped
+
+
+def index_type_of(index: faiss.Index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivf"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(base, faiss.IndexFlat):
+        return "flat"
+    return type(base).__name__
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, index_type: str,
+                hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64,
+                nlist: Optional[int] = None, nprobe: int = 8, pq_m: Optional[int] = None) -> faiss.Index:
+    """Build an index of `index_type` holding `vectors` under `ids`."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    dim = vectors.shape[1]
+    if index_type == "auto":
+        index_type = choose_index_type(len(vectors))
+
+    if index_type == "flat":
+        base = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, hnsw_m)
+        base.hnsw.efConstruction = ef_construction
+        base.hnsw.efSearch = ef_search
+    elif index_type == "sq8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+        base.train(vectors)
+    elif index_type in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(len(vectors))
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        else:
+            # 8-bit codes need 256 training points per sub-quantizer; small corpora get fewer bits
+            nbits = max(1, min(8, int(math.log2(max(len(vectors), 2)))))
+            index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m or default_pq_m(dim), nbits)
+        index.train(vectors)
+        index.nprobe = min(nprobe, nlist)
+        # IVF stores IDs in its lists; the hashtable allows reconstruct/remove by ID
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if len(vectors):
+            index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+        return index
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    index = faiss.IndexIDMap2(base)
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
+
+
+def stored_ids(index: faiss.Index) -> np.ndarray:
+    """IDs of every vector stored in the index."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        invlists = base.invlists
+        ids = [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(base.nlist) if invlists.list_size(list_no)
+        ]
+        return np.concatenate(ids).astype("int64") if ids else np.empty(0, dtype="int64")
+    return faiss.vector_to_array(index.id_map).astype("int64")
+
+
+def reconstruct_all(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (ids, vectors) of every vector stored in the index.
+
+    Vectors of compressed indexes are decoded, so they are approximate.
+    """
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        ids = stored_ids(index)
+        if not len(ids):
+            return ids, np.empty((0, base.d), dtype="float32")
+        if isinstance(base, faiss.IndexIVFFlat):
+            # Flat IVF codes are the raw float32 vectors, in list order
+            invlists = base.invlists
+            codes = [
+                faiss.rev_swig_ptr(invlists.get_codes(list_no), invlists.list_size(list_no) * invlists.code_size)
+                for list_no in range(base.nlist) if invlists.list_size(list_no)
+            ]
+            return ids, np.frombuffer(np.concatenate(codes).tobytes(), dtype="float32").reshape(-1, base.d)
+        return ids, np.vstack([base.reconstruct(int(vector_id)) for vector_id in ids])
+    ids = stored_ids(index)
+    vectors = base.reconstruct_n(0, base.ntotal) if base.ntotal else np.empty((0, index.d), dtype="float32")
+    return ids, vectors
+
+
+def removes_in_place(index: faiss.Index) -> bool:
+    """Whether the index can delete vectors itself (an HNSW graph has to be rebuilt)."""
+    return index_type_of(index) != "hnsw"
+
+
+def build_like(index: faiss.Index, vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+    """A new HNSW index with the parameters of `index`, holding `vectors` under `ids`."""
+    base = base_index(index)
+    return build_index(
+        vectors, ids, "hnsw",
+        hnsw_m=base.hnsw.nb_neighbors(1), ef_construction=base.hnsw.efConstruction, ef_search=base.hnsw.efSearch,
+    )
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> Tuple[faiss.Index, int]:
+    """Remove vectors by ID, rebuilding indexes that cannot delete in place (HNSW).
+
+    Returns the (possibly new) index and the number of vectors removed.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if removes_in_place(index):
+        return index, int(index.remove_ids(ids))
+    stored_ids, vectors = reconstruct_all(index)
+    keep = ~np.isin(stored_ids, ids)
+    return build_like(index, vectors[keep], stored_ids[keep]), int((~keep).sum())
+
+
+def excluding(ids) -> Tuple[faiss.IDSelector, faiss.IDSelector]:
+    """A selector of every ID except `ids`, and the batch selector it wraps (keep both alive)."""
+    ids = np.asarray(sorted(ids), dtype="int64")
+    batch = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    return faiss.IDSelectorNot(batch), batch
+
+
+def bytes_per_vector(index: faiss.Index) -> float:
+    """Serialized index size divided by the number of vectors."""
+    return len(faiss.serialize_index(index)) / max(1, index.ntotal)
+
+
+def exact_rerank(queries: np.ndarray, candidate_ids: np.ndarray, candidate_vectors: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-score candidates with exact L2 distances and keep the best k.
+
+    `candidate_vectors` has shape (n_queries, n_candidates, dim); missing
+    candidates (ID -1) are pushed to the end.
+    """
+    distances = ((candidate_vectors - queries[:, None, :]) ** 2).sum(axis=2)
+    distances[candidate_ids < 0] = np.inf
+    order = np.argsort(distances, axis=1)[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(candidate_ids, order, axis=1)
+
+
+def exact_search(queries: np.ndarray, ids: np.ndarray, vectors: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force L2 search of `queries` over a small set of (ids, vectors).
+
+    Results are padded with ID -1 when fewer than k vectors are given.
+    """
+    distances = ((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T
+                 + (vectors ** 2).sum(axis=1)[None, :])
+    found = min(k, len(ids))
+    top = np.argpartition(distances, found - 1, axis=1)[:, :found] if found else np.empty((len(queries), 0), int)
+    top_distances = np.take_along_axis(distances, top, axis=1)
+    order = np.argsort(top_distances, axis=1)
+    out_distances = np.full((len(queries), k), np.inf, dtype="float32")
+    out_ids = np.full((len(queries), k), -1, dtype="int64")
+    out_distances[:, :found] = np.take_along_axis(top_distances, order, axis=1)
+    out_ids[:, :found] = np.asarray(ids, dtype="int64")[np.take_along_axis(top, order, axis=1)]
+    return out_distances, out_ids
+
+
+def search_parameters(index: faiss.Index, ef_search: Optional[int] = None, nprobe: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """Per-call search knobs; None keeps the values stored in the index.
+
+    `selector` restricts the search to the IDs it selects.
+    """
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or base.hnsw.efSearch, sel=selector)
+    if isinstance(base, faiss.IndexIVF) and (nprobe is not None or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or base.nprobe, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def recall_report(index: faiss.Index, k: int = 5, n_queries: int = 200,
+                  ef_search_values=(16, 32, 64, 128, 256), nprobe_values=(1, 2, 4, 8, 16, 32),
+                  exact: Optional[Tuple[np.ndarray, np.ndarray]] = None, rerank_factor: int = 0,
+                  seed: int = 0) -> List[Dict[str, float]]:
+    """Recall@k and latency of `index` against an exact scan of its vectors.
+
+    `exact` supplies the uncompressed (ids, vectors) when the index is lossy.
+    With `rerank_factor`, each setting is also measured with exact re-ranking
+    of k * rerank_factor candidates. Queries are stored vectors with a little
+    noise, so they behave like real queries near the data.
+    """
+    ids, vectors = exact if exact is not None else reconstruct_all(index)
+    if not len(vectors):
+        return []
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(scale=0.01, size=(len(sample), vectors.shape[1])).astype("float32")
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    start = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    truth = ids[truth]
+    row_of = {int(vector_id): row for row, vector_id in enumerate(ids)}
+
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        settings = [("efSearch", value, faiss.SearchParametersHNSW(efSearch=value)) for value in ef_search_values]
+    elif isinstance(base, faiss.IndexIVF):
+        settings = [("nprobe", value, faiss.SearchParametersIVF(nprobe=value))
+                    for value in nprobe_values if value <= base.nlist]
+    else:
+        settings = [(index_type_of(index), 0, None)]
+
+    size = bytes_per_vector(index)
+    rows = [{"setting": "exact scan", "value": 0, "recall": 1.0, "ms_per_query": exact_ms,
+             "bytes_per_vector": vectors.shape[1] * 4 + 8}]
+
+    def _recall(found):
+        return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+    for name, value, params in settings:
+        start = time.perf_counter()
+        _, found = index.search(queries, k, params=params)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        rows.append({"setting": name, "value": value, "recall": _recall(found), "ms_per_query": ms,
+                     "bytes_per_vector": size})
+        if rerank_factor > 1:
+            start = time.perf_counter()
+            _, candidates = index.search(queries, k * rerank_factor, params=params)
+            candidate_vectors = vectors[[[row_of.get(int(c), 0) for c in row] for row in candidates]]
+            _, found = exact_rerank(queries, candidates, candidate_vectors, k)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            rows.append({"setting": f"{name}+rerank", "value": value, "recall": _recall(found),
+                         "ms_per_query": ms, "bytes_per_vector": size})
+    return rows
+
+
+def format_report(rows: List[Dict[str, float]], k: int) -> str:
+    lines = [f"{'setting':>16} {'value':>6} {'recall@' + str(k):>10} {'ms/query':>9} {'bytes/vector':>13}"]
+    for row in rows:
+        lines.append(f"{row['setting']:>16} {row['value']:>6} {row['recall']:>10.3f} "
+                     f"{row['ms_per_query']:>9.3f} {row['bytes_per_vector']:>13.1f}")
+    return "\n".join(lines)